@@ -1,6 +1,6 @@
 {
     'name': 'Clinic Management',
-    'version': '18.0.1.0.0',
+    'version': '18.0.1.4.0',
     'summary': 'Complete Healthcare & Clinic Management System',
     'description': """
         This module provides a complete clinic management system with:
@@ -36,17 +36,20 @@
         # Data
         'data/days_master_data.xml',
         'data/website_menu_data.xml',
+        'data/ir_cron_data.xml',
         'data/email_templates_appointment_complete.xml',
         
         # Views
         'views/days_views.xml',
         'views/service_views.xml',
         'views/slot_views.xml',
+        'views/slot_occupancy_views.xml',
         'views/doctor_views.xml',
         'views/patient_views.xml',
         'views/labtest_views.xml',
     # prescription views removed; functionality moved into appointment
         'views/appointment_views.xml',
+        'views/appointment_job_views.xml',
         'views/holiday_views.xml',
         'views/testimonial_views.xml',
         'views/clinic_website_settings_views.xml',
@@ -1,39 +1,83 @@
 from odoo import http, fields, _
+from odoo.exceptions import ValidationError
 from odoo.http import request
+from odoo.tools import lazy
+from psycopg2 import errors
 from datetime import datetime, timedelta
+import hashlib
 import logging
+import uuid
 import json
 import base64
 
 _logger = logging.getLogger(__name__)
 
+PG_CONCURRENCY_ERRORS = (errors.SerializationFailure, errors.DeadlockDetected, errors.LockNotAvailable)
+BOOKING_TOKEN_CONSTRAINT = 'clinic_appointment_booking_token_uniq'
+
+# How long shared caches may serve a public clinic page
+PUBLIC_PAGE_MAX_AGE = 300
+
 class ClinicWebsite(http.Controller):
     
     def _get_clinic_settings(self):
-        """Get clinic website settings"""
-        settings = request.env['clinic.website.settings'].sudo().get_settings()
-        return settings
+        """Get the cached snapshot of the clinic website settings"""
+        return request.env['clinic.website.settings']._get_settings_snapshot()
+    
+    def _render_public_page(self, page, template, values):
+        """Render a public page with its content fragment cached and HTTP validators for browsers
+
+        Values should be lazy so nothing is queried when the fragment is cached.
+        """
+        cache_key = request.env['clinic.website.settings']._get_content_cache_key(page)
+        values['content_cache_key'] = cache_key
+        if not cache_key:
+            return request.render(template, values)
+        
+        # Layout, menu and template edits and module updates change the page
+        # around the cached fragment, the registry and templates cache
+        # sequences and the website's write date follow them. The layout also
+        # renders the visitor's login and session CSRF token, a revalidated
+        # page must not keep stale ones.
+        registry = request.env.registry
+        etag_key = (
+            cache_key,
+            registry.registry_sequence,
+            registry.cache_sequences.get('templates'),
+            str(request.website.write_date),
+            request.env.uid,
+            request.csrf_token(None),
+        )
+        etag = hashlib.sha1(repr(etag_key).encode()).hexdigest()
+        if request.env.user._is_public():
+            # Browsers revalidate, shared caches keep the page for every visitor
+            # sending the same session cookie, or none at all
+            cache_control = f'public, max-age=0, s-maxage={PUBLIC_PAGE_MAX_AGE}'
+        else:
+            cache_control = 'private, no-cache'
+        headers = [
+            ('Cache-Control', cache_control),
+            ('Vary', 'Cookie'),
+            ('ETag', f'"{etag}"'),
+        ]
+        if request.httprequest.if_none_match.contains(etag):
+            return request.make_response('', headers=headers, status=304)
+        return request.render(template, values, headers=headers)
     
     @http.route(['/clinic'], type='http', auth='public', website=True)
     def clinic_home(self, **kw):
         """Render the clinic homepage with all required data"""
-        services = request.env['clinic.service'].sudo().search([('active', '=', True)])
-        doctors = request.env['clinic.doctor'].sudo().search([('active', '=', True)])
-        clinic_settings = self._get_clinic_settings()
-        
-        # Fetch testimonials for the homepage
-        testimonials = request.env['clinic.testimonial'].sudo().search([
-            ('state', '=', 'published')
-        ], order='date desc, id desc')
-        
         values = {
-            'services': services,
-            'doctors': doctors,
-            'testimonials': testimonials,
-            'clinic_settings': clinic_settings,
+            'services': lazy(lambda: request.env['clinic.service'].sudo().search([('active', '=', True)])),
+            'doctors': lazy(lambda: request.env['clinic.doctor'].sudo().search([('active', '=', True)])),
+            # Fetch testimonials for the homepage
+            'testimonials': lazy(lambda: request.env['clinic.testimonial'].sudo().search([
+                ('state', '=', 'published')
+            ], order='date desc, id desc')),
+            'clinic_settings': lazy(self._get_clinic_settings),
             'page_name': 'clinic_home',
         }
-        return request.render('clinic_management.clinic_homepage', values)
+        return self._render_public_page('home', 'clinic_management.clinic_homepage', values)
     
     @http.route(['/clinic/doctor/<model("clinic.doctor"):doctor>'], type='http', auth='public', website=True)
     def doctor_detail(self, doctor, **kw):
@@ -65,22 +109,20 @@ class ClinicWebsite(http.Controller):
     @http.route(['/clinic/services'], type='http', auth='public', website=True)
     def services(self, **kw):
         """Display all available services/treatments"""
-        services = request.env['clinic.service'].sudo().search([('active', '=', True)])
-        clinic_settings = self._get_clinic_settings()
+        services = lazy(lambda: request.env['clinic.service'].sudo().search([('active', '=', True)]))
         
         # Prepare services data for JavaScript
-        services_data = []
-        for service in services:
-            services_data.append({
+        def services_data_json():
+            return json.dumps([{
                 'id': service.id,
                 'name': service.name,
                 'description': service.description or '',
-            })
+            } for service in services])
             
-        return request.render('clinic_management.services_page', {
+        return self._render_public_page('services', 'clinic_management.services_page', {
             'services': services,
-            'clinic_settings': clinic_settings,
-            'services_data_json': json.dumps(services_data),
+            'clinic_settings': lazy(self._get_clinic_settings),
+            'services_data_json': lazy(services_data_json),
             'page_name': 'clinic_services',
         })
 
@@ -93,10 +135,8 @@ class ClinicWebsite(http.Controller):
         clinic_settings = self._get_clinic_settings()
         
         # Get doctors who offer this service
-        doctors = request.env['clinic.doctor'].sudo().search([
-            ('specialization_ids', 'in', service.id),
-            ('active', '=', True)
-        ])
+        Doctor = request.env['clinic.doctor'].sudo()
+        doctors = Doctor.browse([entry[0] for entry in Doctor._get_doctors_for_service(service.id)])
         
         return request.render('clinic_management.service_detail', {
             'service': service,
@@ -105,6 +145,18 @@ class ClinicWebsite(http.Controller):
             'page_name': 'service_detail',
         })
     
+    @http.route(['/clinic/image/<string:model>/<int:record_id>/<string:field>'], type='http', auth='public', website=True, sitemap=False)
+    def clinic_image(self, model, record_id, field, unique=None, **kw):
+        """Serve a resized clinic image, immutable when requested with its version"""
+        if model not in ('clinic.doctor', 'clinic.service', 'clinic.testimonial', 'clinic.website.settings'):
+            raise request.not_found()
+        record = request.env[model].sudo().browse(record_id).exists()
+        if not record or field not in record._clinic_public_images or not record._clinic_image_is_public():
+            raise request.not_found()
+        
+        stream = request.env['ir.binary']._get_image_stream_from(record, field)
+        return stream.get_response(immutable=bool(unique))
+    
     @http.route(['/clinic/booking'], type='http', auth='public', website=True)
     def booking_form(self, **kw):
         """Display the appointment booking form"""
@@ -115,6 +167,8 @@ class ClinicWebsite(http.Controller):
             'clinic_settings': clinic_settings,
             'page_name': 'booking_form',
             'datetime': datetime,
+            # Idempotency key, a resubmitted form gets its first confirmation back
+            'booking_token': uuid.uuid4().hex,
         })
     
     @http.route(['/clinic/booking/doctors'], type='json', auth='public', website=True)
@@ -126,20 +180,13 @@ class ClinicWebsite(http.Controller):
             if not service_id:
                 return []
             
-            # Find doctors who have this service in their specializations
-            doctors = request.env['clinic.doctor'].sudo().search([
-                ('specialization_ids', 'in', int(service_id)),
-                ('active', '=', True)
-            ])
-            
-            doctor_list = []
-            for doctor in doctors:
-                specializations = ', '.join(doctor.specialization_ids.mapped('name'))
-                doctor_list.append({
-                    'id': doctor.id,
-                    'name': doctor.name,
-                    'specializations': specializations,
-                })
+            # Doctors who have this service in their specializations, from the cached index
+            doctor_list = [{
+                'id': doctor_id,
+                'name': name,
+                'specializations': specializations,
+            } for doctor_id, name, specializations
+                in request.env['clinic.doctor'].sudo()._get_doctors_for_service(int(service_id))]
             
             _logger.info(f"Found {len(doctor_list)} doctors for service {service_id}")
             return doctor_list
@@ -160,45 +207,12 @@ class ClinicWebsite(http.Controller):
             # Convert date string to date object
             booking_date = datetime.strptime(date_str, '%Y-%m-%d').date()
             
-            # Get day of week (Monday=0, Sunday=6)
-            day_index = booking_date.weekday()
-            
-            # Map day index to day names
-            day_names = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-            day_name = day_names[day_index]
-            
-            # Find the day record
-            day_record = request.env['clinic.days'].sudo().search([('name', '=', day_name)], limit=1)
-            
-            if not day_record:
-                _logger.warning(f"Day record not found for {day_name}")
-                return []
-            
-            # Get available slots for this doctor and day
-            available_slots = request.env['clinic.slot'].sudo().search([
-                ('doctor_id', '=', int(doctor_id)),
-                ('day_id', '=', day_record.id),
-                ('status', '=', 'available')
-            ], order='start_time')
+            # Get the slots that still have a free seat on this date
+            doctor = request.env['clinic.doctor'].sudo().browse(int(doctor_id))
+            available_slots = request.env['clinic.slot'].sudo()._get_free_slots(doctor, booking_date)
             
             # Format slots for the dropdown
-            slots_data = []
-            for slot in available_slots:
-                # Convert float time to HH:MM format
-                start_hour = int(slot.start_time)
-                start_min = int((slot.start_time - start_hour) * 60)
-                end_hour = int(slot.end_time)
-                end_min = int((slot.end_time - end_hour) * 60)
-                
-                start_time_str = f"{start_hour:02d}:{start_min:02d}"
-                end_time_str = f"{end_hour:02d}:{end_min:02d}"
-                
-                slots_data.append({
-                    'id': slot.id,
-                    'start_time': start_time_str,
-                    'end_time': end_time_str,
-                    'slot_number': slot.slot_number
-                })
+            slots_data = [self._slot_data(slot) for slot in available_slots]
             
             _logger.info(f"Found {len(slots_data)} available slots")
             return slots_data
@@ -207,12 +221,60 @@ class ClinicWebsite(http.Controller):
             _logger.exception(f"Error in get_available_slots: {str(e)}")
             return []    
             
+    @http.route(['/clinic/booking/availability'], type='json', auth='public', website=True)
+    def get_availability(self, doctor_id, date_from=None, weeks=6, **kw):
+        """AJAX endpoint to get a doctor's free slots for every date of the coming weeks"""
+        try:
+            if not doctor_id:
+                return {}
+            
+            Slot = request.env['clinic.slot'].sudo()
+            if date_from:
+                start_date = datetime.strptime(date_from, '%Y-%m-%d').date()
+            else:
+                start_date = fields.Date.context_today(Slot)
+            weeks = min(max(int(weeks), 1), 8)
+            end_date = start_date + timedelta(days=weeks * 7 - 1)
+            
+            doctor = request.env['clinic.doctor'].sudo().browse(int(doctor_id))
+            availability = Slot._get_availability(doctor, start_date, end_date)
+            return {
+                'slots': [self._slot_data(slot) for slot in availability['slots']],
+                'days': availability['days'],
+            }
+            
+        except Exception as e:
+            _logger.exception("Error in get_availability: %s", str(e))
+            return {}
+    
+    def _slot_data(self, slot):
+        """Format a slot for the booking form, times as HH:MM"""
+        start_hour = int(slot.start_time)
+        start_min = int((slot.start_time - start_hour) * 60)
+        end_hour = int(slot.end_time)
+        end_min = int((slot.end_time - end_hour) * 60)
+        return {
+            'id': slot.id,
+            'start_time': f"{start_hour:02d}:{start_min:02d}",
+            'end_time': f"{end_hour:02d}:{end_min:02d}",
+            'slot_number': slot.slot_number
+        }
+            
     @http.route(['/clinic/booking/submit'], type='http', auth='public', website=True, methods=['POST'], csrf=True)
     def submit_booking(self, **post):
         """Process the appointment booking form submission"""
         try:
             # Log all submitted form data (except sensitive information)
             _logger.info("Booking form submitted with data: %s", {k: v for k, v in post.items() if k not in ['csrf_token']})
+
+            # A double click or a browser retry of a booked form does nothing again
+            booking_token = post.get('booking_token') or False
+            if booking_token:
+                appointment = request.env['clinic.appointment'].sudo().search([
+                    ('booking_token', '=', booking_token)
+                ], limit=1)
+                if appointment:
+                    return self._render_booking_confirmation(appointment)
             
             # Validate required fields
             required_fields = ['patient_name', 'gender', 'age', 'phone', 'service_id', 'doctor_id', 'appointment_date', 'symptom']
@@ -228,7 +290,8 @@ class ClinicWebsite(http.Controller):
                 return request.render('clinic_management.booking_form', {
                     'services': request.env['clinic.service'].sudo().search([('active', '=', True)]),
                     'error_message': 'Please fill in all required fields.',
-                    'form_data': post
+                    'form_data': post,
+                    'booking_token': post.get('booking_token'),
                 })
             
             # Extract form data
@@ -240,19 +303,6 @@ class ClinicWebsite(http.Controller):
                 'email': post.get('email') or False,
             }
             
-            # Check if patient already exists
-            existing_patient = request.env['clinic.patient'].sudo().search([
-                ('phone', '=', patient_data['phone'])
-            ], limit=1)
-            
-            if existing_patient:
-                patient = existing_patient
-                # Update patient info if needed
-                patient.sudo().write(patient_data)
-            else:
-                # Create new patient
-                patient = request.env['clinic.patient'].sudo().create(patient_data)
-            
             # Create appointment
             service_id = int(post.get('service_id'))
             doctor_id = int(post.get('doctor_id'))
@@ -261,7 +311,6 @@ class ClinicWebsite(http.Controller):
             doctor = request.env['clinic.doctor'].sudo().browse(doctor_id)
             
             appointment_vals = {
-                'patient_id': patient.id,
                 'service_id': service_id,
                 'doctor_id': doctor.id,
                 'appointment_date': appointment_date,
@@ -269,6 +318,7 @@ class ClinicWebsite(http.Controller):
                 'currency_id': doctor.currency_id.id,
                 'symptom': post.get('symptom') or False,
                 'state': 'confirmed',  # Fixed: use 'confirmed' instead of 'confirm'
+                'booking_token': booking_token,
             }
             
             # Handle slot if provided
@@ -278,53 +328,94 @@ class ClinicWebsite(http.Controller):
                     slot_id = int(slot_id)
                     slot = request.env['clinic.slot'].sudo().browse(slot_id)
                     
-                    if slot.exists() and slot.status == 'available':
+                    booking_date = fields.Date.to_date(appointment_date)
+                    if slot.exists() and slot in slot._get_free_slots(doctor, booking_date):
                         appointment_vals.update({
                             'slot_id': slot.id,
                             'start_time': slot.start_time,
                             'end_time': slot.end_time,
                         })
-                        
-                        # Create appointment
-                        appointment = request.env['clinic.appointment'].sudo().create(appointment_vals)
-                        
-                        # Mark slot as booked
-                        slot.sudo().write({
-                            'status': 'booked'
-                        })
                     else:
-                        return request.render('clinic_management.booking_form', {
-                            'services': request.env['clinic.service'].sudo().search([('active', '=', True)]),
-                            'error_message': 'Selected time slot is no longer available.',
-                            'form_data': post
-                        })
+                        return self._render_slot_unavailable(post)
                 except (ValueError, TypeError):
                     # Invalid slot_id, proceed with simple appointment
-                    appointment = request.env['clinic.appointment'].sudo().create(appointment_vals)
-            else:
-                # Simple appointment without slots
-                appointment = request.env['clinic.appointment'].sudo().create(appointment_vals)
+                    pass
             
-            # Confirm appointment
-            if hasattr(appointment, 'action_confirm'):
-                appointment.sudo().action_confirm()
+            # Create and confirm the appointment together: action_confirm reserves
+            # the seat atomically and drops the appointment if the slot filled up.
+            # The patient goes in the same savepoint, a duplicate submission or a
+            # full slot leaves no patient behind.
+            try:
+                with request.env.cr.savepoint():
+                    appointment_vals['patient_id'] = self._get_booking_patient(patient_data).id
+                    appointment = request.env['clinic.appointment'].sudo().create(appointment_vals)
+                    appointment.action_confirm()
+            except ValidationError:
+                return self._render_slot_unavailable(post)
+            except errors.UniqueViolation as e:
+                if e.diag.constraint_name != BOOKING_TOKEN_CONSTRAINT:
+                    raise
+                # A concurrent submission of the same form committed first
+                return self._redirect_to_booking(booking_token)
             
             # Return success page
-            clinic_settings = self._get_clinic_settings()
-            return request.render('clinic_management.booking_confirmation', {
-                'appointment': appointment,
-                'clinic_settings': clinic_settings,
-                'page_name': 'booking_confirmation',
-            })
+            return self._render_booking_confirmation(appointment)
             
+        except PG_CONCURRENCY_ERRORS:
+            # Let the request retry loop replay the booking on a fresh snapshot
+            raise
         except Exception as e:
             _logger.exception("Error during booking submission: %s", str(e))
             return request.render('clinic_management.booking_form', {
                 'services': request.env['clinic.service'].sudo().search([('active', '=', True)]),
                 'error_message': 'An error occurred while processing your booking. Please try again.',
-                'form_data': post
+                'form_data': post,
+                'booking_token': post.get('booking_token'),
             })
     
+    def _get_booking_patient(self, patient_data):
+        """Return the patient booking with ``patient_data``, created unless already known"""
+        # Check if patient already exists, whatever format the number was typed in
+        Patient = request.env['clinic.patient'].sudo()
+        patient = Patient._find_by_phone(patient_data['phone'], patient_data['name'])
+        if not patient:
+            return Patient.create(patient_data)
+        # Only complete the record, a web form never overwrites what the clinic entered
+        missing = {fname: value for fname, value in patient_data.items()
+                   if value and not patient[fname]}
+        if missing:
+            patient.write(missing)
+        return patient
+
+    def _render_slot_unavailable(self, post):
+        """Re-display the booking form when the chosen slot is taken"""
+        return request.render('clinic_management.booking_form', {
+            'services': request.env['clinic.service'].sudo().search([('active', '=', True)]),
+            'error_message': 'Selected time slot is no longer available.',
+            'form_data': post,
+            'booking_token': post.get('booking_token'),
+        })
+
+    def _render_booking_confirmation(self, appointment):
+        clinic_settings = self._get_clinic_settings()
+        return request.render('clinic_management.booking_confirmation', {
+            'appointment': appointment,
+            'clinic_settings': clinic_settings,
+            'page_name': 'booking_confirmation',
+        })
+
+    def _redirect_to_booking(self, booking_token):
+        """Redirect to the appointment booked with ``booking_token`` by another transaction
+
+        It is not visible in the snapshot of this one, so it is looked up on a fresh cursor.
+        """
+        with request.env.registry.cursor() as cr:
+            cr.execute("SELECT id FROM clinic_appointment WHERE booking_token = %s", [booking_token])
+            row = cr.fetchone()
+        if not row:
+            return request.redirect('/clinic/booking')
+        return request.redirect(f'/clinic/booking/confirmation/{row[0]}')
+    
     @http.route(['/clinic/testimonials'], type='http', auth='public', website=True)
     def testimonials(self, **kw):
         """Display all published testimonials"""
@@ -409,24 +500,19 @@ class ClinicWebsite(http.Controller):
     @http.route(['/clinic/doctors'], type='http', auth='public', website=True)
     def doctors_list(self, **kw):
         """Display all doctors"""
-        doctors = request.env['clinic.doctor'].sudo().search([('active', '=', True)])
-        specializations = request.env['clinic.specialization'].sudo().search([])
-        clinic_settings = self._get_clinic_settings()
-        
-        return request.render('clinic_management.doctors_page', {
-            'doctors': doctors,
-            'specializations': specializations,
-            'clinic_settings': clinic_settings,
+        # Specializations are the clinic services
+        return self._render_public_page('doctors', 'clinic_management.doctors_page', {
+            'doctors': lazy(lambda: request.env['clinic.doctor'].sudo().search([('active', '=', True)])),
+            'specializations': lazy(lambda: request.env['clinic.service'].sudo().search([('active', '=', True)])),
+            'clinic_settings': lazy(self._get_clinic_settings),
             'page_name': 'doctors_list',
         })
     
     @http.route(['/clinic/about'], type='http', auth='public', website=True)
     def about_us(self, **kw):
         """About us page"""
-        clinic_settings = self._get_clinic_settings()
-        
-        return request.render('clinic_management.about_page', {
-            'clinic_settings': clinic_settings,
+        return self._render_public_page('about', 'clinic_management.about_page', {
+            'clinic_settings': lazy(self._get_clinic_settings),
             'page_name': 'about_us',
         })
     
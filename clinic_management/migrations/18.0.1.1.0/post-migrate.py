@@ -0,0 +1,86 @@
+import logging
+
+from odoo import api, SUPERUSER_ID
+from odoo.tools.sql import column_exists
+
+_logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 100
+
+# Binary fields that moved from table columns to the filestore
+ATTACHMENT_FIELDS = {
+    'clinic.doctor': ['image'],
+    'clinic.service': ['icon'],
+    'clinic.patient': ['medical_report'],
+    'clinic.lab.test': ['result_document'],
+    'clinic.testimonial': ['image'],
+    'clinic.website.settings': [
+        'clinic_logo', 'banner_image',
+        'clinic_image_1', 'clinic_image_2', 'clinic_image_3',
+        'clinic_image_4', 'clinic_image_5', 'clinic_image_6',
+        'treatment_image_1', 'treatment_image_2', 'treatment_image_3', 'treatment_image_4',
+    ],
+}
+
+
+def _move_column_to_attachments(env, model, column):
+    """Stream one binary column into ir.attachment, a batch of rows at a time, then drop it"""
+    table = env[model]._table
+    if not column_exists(env.cr, table, column):
+        return
+    Attachment = env['ir.attachment']
+    moved = 0
+    last_id = 0
+    while True:
+        env.cr.execute(f"""
+            SELECT id, "{column}" FROM "{table}"
+             WHERE id > %s AND "{column}" IS NOT NULL
+             ORDER BY id
+             LIMIT %s
+        """, (last_id, BATCH_SIZE))
+        rows = env.cr.fetchall()
+        if not rows:
+            break
+        Attachment.create([{
+            'name': column,
+            'res_model': model,
+            'res_field': column,
+            'res_id': record_id,
+            'type': 'binary',
+            'datas': bytes(value),
+        } for record_id, value in rows])
+        moved += len(rows)
+        last_id = rows[-1][0]
+        # Keep memory flat, the blobs of a batch are not needed anymore
+        env.flush_all()
+        env.invalidate_all()
+    env.cr.execute(f'ALTER TABLE "{table}" DROP COLUMN "{column}"')
+    _logger.info("Moved %s %s.%s values to the filestore", moved, model, column)
+
+
+def _recompute_variants(env, model, columns):
+    """Regenerate the stored image variants, computed before their source was moved"""
+    Model = env[model]
+    variants = [
+        field for field in Model._fields.values()
+        if field.store and field.related and field.related.split('.')[0] in columns
+    ]
+    if not variants:
+        return
+    ids = Model.with_context(active_test=False).search([]).ids
+    for start in range(0, len(ids), BATCH_SIZE):
+        records = Model.browse(ids[start:start + BATCH_SIZE])
+        for field in variants:
+            env.add_to_compute(field, records)
+        env.flush_all()
+        env.invalidate_all()
+
+
+def migrate(cr, version):
+    if not version:
+        return
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    for model, columns in ATTACHMENT_FIELDS.items():
+        for column in columns:
+            _move_column_to_attachments(env, model, column)
+        _recompute_variants(env, model, columns)
@@ -0,0 +1,26 @@
+import logging
+
+from odoo import api, SUPERUSER_ID
+from odoo.tools.sql import column_exists
+
+_logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+
+def migrate(cr, version):
+    if not version:
+        return
+    env = api.Environment(cr, SUPERUSER_ID, {})
+
+    # Fill the symptom logs from the visits completed so far
+    Appointment = env['clinic.appointment']
+    ids = Appointment.search([('state', '=', 'completed'), ('symptom', '!=', False)]).ids
+    for start in range(0, len(ids), BATCH_SIZE):
+        env['clinic.patient.symptom']._log_appointments(Appointment.browse(ids[start:start + BATCH_SIZE]))
+        env.invalidate_all()
+    _logger.info("Logged the symptoms of %s completed appointments", len(ids))
+
+    # The concatenated history is replaced by the log
+    if column_exists(cr, 'clinic_patient', 'symptom'):
+        cr.execute('ALTER TABLE clinic_patient DROP COLUMN symptom')
@@ -0,0 +1,98 @@
+import logging
+
+from odoo import api, fields, SUPERUSER_ID
+
+from odoo.addons.clinic_management.models.slot_occupancy import SEAT_STATES
+
+_logger = logging.getLogger(__name__)
+
+
+def _reset_slot_templates(env):
+    """Reopen the weekday slot templates, booking, expiry and leaves now live on dated rows"""
+    env.cr.execute("""
+        UPDATE clinic_slot
+           SET status = 'available'
+         WHERE status IN ('booked', 'blocked', 'expired')
+    """)
+    _logger.info("Reopened %s slot templates", env.cr.rowcount)
+    env['clinic.slot'].invalidate_model(['status'])
+
+
+def _backfill_occupancy(env):
+    """Count the seats of upcoming booked appointments that predate the occupancy rows"""
+    params = {'uid': SUPERUSER_ID, 'states': list(SEAT_STATES), 'today': fields.Date.context_today(env.user)}
+    env.cr.execute("""
+        INSERT INTO clinic_slot_occupancy AS o
+            (slot_id, doctor_id, date, start_time, end_time, max_patients,
+             booked_count, free_capacity, state, create_uid, create_date, write_uid, write_date)
+        SELECT s.id, s.doctor_id, a.appointment_date, s.start_time, s.end_time, COALESCE(s.max_patients, 1),
+               COUNT(*), GREATEST(COALESCE(s.max_patients, 1) - COUNT(*), 0),
+               CASE WHEN COUNT(*) >= COALESCE(s.max_patients, 1) THEN 'full' ELSE 'open' END,
+               %(uid)s, now() at time zone 'UTC', %(uid)s, now() at time zone 'UTC'
+          FROM clinic_appointment a
+          JOIN clinic_slot s ON s.id = a.slot_id
+         WHERE a.occupancy_id IS NULL
+           AND a.state = ANY(%(states)s)
+           AND a.appointment_date >= %(today)s
+         GROUP BY s.id, a.appointment_date
+        ON CONFLICT (slot_id, date) DO UPDATE
+           SET booked_count = o.booked_count + EXCLUDED.booked_count,
+               free_capacity = CASE WHEN o.state IN ('blocked', 'expired') THEN 0
+                                    ELSE GREATEST(o.max_patients - o.booked_count - EXCLUDED.booked_count, 0) END,
+               state = CASE WHEN o.state IN ('blocked', 'expired') THEN o.state
+                            WHEN o.booked_count + EXCLUDED.booked_count >= o.max_patients THEN 'full'
+                            ELSE 'open' END,
+               write_uid = EXCLUDED.write_uid,
+               write_date = EXCLUDED.write_date
+    """, params)
+    env.cr.execute("""
+        UPDATE clinic_appointment a
+           SET occupancy_id = o.id
+          FROM clinic_slot_occupancy o
+         WHERE o.slot_id = a.slot_id
+           AND o.date = a.appointment_date
+           AND a.occupancy_id IS NULL
+           AND a.state = ANY(%(states)s)
+           AND a.appointment_date >= %(today)s
+    """, params)
+    _logger.info("Linked %s upcoming appointments to their slot occupancy", env.cr.rowcount)
+    env['clinic.slot.occupancy'].invalidate_model()
+    env['clinic.appointment'].invalidate_model(['occupancy_id'])
+
+
+def _block_current_leaves(env):
+    """Block the dated slots of the approved leaves that are not over yet"""
+    leaves = env['clinic.holiday'].search([
+        ('state', '=', 'approved'),
+        ('to_date', '>=', fields.Date.context_today(env.user)),
+    ])
+    leaves._block_seats()
+
+
+def _build_daily_stats(env):
+    """Fill the dashboard rollup right away instead of waiting for the first cron run"""
+    env['clinic.appointment.daily.stat']._rebuild()
+    env['ir.config_parameter'].set_param('clinic_management.daily_stat_refreshed_at',
+                                         fields.Datetime.to_string(fields.Datetime.now()))
+
+
+def _drop_phone_key_unique_index(env):
+    """Family members may share a phone number, patients are now looked up by number and name"""
+    env.cr.execute("DROP INDEX IF EXISTS clinic_patient_company_phone_key_uniq")
+
+
+def _drop_pending_release_index(env):
+    """Replaced by clinic_holiday_unreleased_index, whose predicate the expiry cron's query matches"""
+    env.cr.execute("DROP INDEX IF EXISTS clinic_holiday_pending_release_index")
+
+
+def migrate(cr, version):
+    if not version:
+        return
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    _reset_slot_templates(env)
+    _backfill_occupancy(env)
+    _block_current_leaves(env)
+    _build_daily_stats(env)
+    _drop_phone_key_unique_index(env)
+    _drop_pending_release_index(env)
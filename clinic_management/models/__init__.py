@@ -1,10 +1,15 @@
+from . import image_mixin
 from . import doctor
 from . import service
 from . import days_master
 from . import slot
+from . import slot_occupancy
 from . import patient
+from . import patient_symptom
 from . import labtest
 from . import appointment
+from . import appointment_daily_stat
+from . import appointment_job
 from . import holiday
 from . import res_config_settings
 from . import testimonial
@@ -1,11 +1,17 @@
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
 from odoo.exceptions import ValidationError
+from collections import Counter
 from datetime import timedelta, datetime
 import pytz
-import io
 import base64
-import logging
+import json
 
+from .slot_occupancy import SEAT_STATES
+from .appointment_job import JOB_STATES
+from ..tools.prescription_pdf import render_pdfs
+
+# Fields feeding the daily statistics rollup
+DAILY_STAT_FIELDS = {'company_id', 'doctor_id', 'appointment_date', 'state', 'consulting_fee'}
 
 
 class ClinicAppointment(models.Model):
@@ -15,7 +21,9 @@ class ClinicAppointment(models.Model):
     _order = 'appointment_date desc, id desc'
     
     name = fields.Char(string='Reference', readonly=True, copy=False, default='New')
-    patient_id = fields.Many2one('clinic.patient', string='Patient', required=True, tracking=True)
+    booking_token = fields.Char(string='Booking Token', readonly=True, copy=False,
+                                help='Issued with the website booking form, a resubmitted form finds its appointment by it')
+    patient_id = fields.Many2one('clinic.patient', string='Patient', required=True, tracking=True, index=True)
     patient_age = fields.Integer(related='patient_id.age', string='Age', store=True)
     patient_gender = fields.Selection(related='patient_id.gender', string='Gender', store=True)
     patient_phone = fields.Char(related='patient_id.phone', string='Phone', store=True)
@@ -23,8 +31,10 @@ class ClinicAppointment(models.Model):
     
     service_id = fields.Many2one('clinic.service', string='Service', required=True, tracking=True)
     doctor_id = fields.Many2one('clinic.doctor', string='Doctor', required=True, tracking=True)
-    slot_id = fields.Many2one('clinic.slot', string='Slot', required=True, tracking=True,)
+    slot_id = fields.Many2one('clinic.slot', string='Slot', required=True, tracking=True, index=True)
     slots = fields.Many2many('clinic.slot', string='Slots')
+    occupancy_id = fields.Many2one('clinic.slot.occupancy', string='Slot Occupancy',
+                                   readonly=True, copy=False, index=True)
 
     appointment_date = fields.Date(string='Appointment Date', required=True, tracking=True)
     
@@ -51,6 +61,10 @@ class ClinicAppointment(models.Model):
     # medicine_image replaces the old prescription model; store handwritten image per appointment
     medicine_image = fields.Binary(string='Medicine / Prescription Image',attachment=True)
     medicine_image_filename = fields.Char(string='Medicine Image Filename')
+    # Rendered prescription, reused while the image keeps the same checksum
+    prescription_pdf_id = fields.Many2one('ir.attachment', string='Prescription PDF',
+                                          readonly=True, copy=False)
+    prescription_checksum = fields.Char(string='Prescription Image Checksum', readonly=True, copy=False)
     lab_test_ids = fields.One2many('clinic.lab.test', 'appointment_id', string='Lab Tests')
     invoice_id = fields.Many2one('account.move', string='Invoice')
     
@@ -77,7 +91,31 @@ class ClinicAppointment(models.Model):
     color = fields.Integer(string='Color', compute='_compute_color')
     
     lab_test_count = fields.Integer(compute='_compute_counts')
-    
+
+    _sql_constraints = [
+        ('booking_token_uniq', 'unique(booking_token)',
+         'This booking form was already submitted!'),
+    ]
+
+    # Background completion work (follow-up, prescription PDF, email)
+    completion_job_ids = fields.One2many('clinic.appointment.job', 'appointment_id', string='Completion Jobs')
+    completion_job_state = fields.Selection(JOB_STATES, string='Completion Processing',
+                                            compute='_compute_completion_job_state')
+    
+    def init(self):
+        # Booking checks and doctor schedules
+        tools.create_index(self.env.cr, 'clinic_appointment_doctor_date_index',
+                           self._table, ['doctor_id', 'appointment_date'])
+        # Dashboard tiles and the keyset-paged table, optionally filtered by state
+        tools.create_index(self.env.cr, 'clinic_appointment_company_date_id_index',
+                           self._table, ['company_id', 'appointment_date DESC', 'id DESC'])
+        tools.create_index(self.env.cr, 'clinic_appointment_company_state_date_index',
+                           self._table, ['company_id', 'state', 'appointment_date DESC', 'id DESC'])
+        # Crons only ever sweep the appointments that are still open
+        tools.create_index(self.env.cr, 'clinic_appointment_open_date_index',
+                           self._table, ['appointment_date', 'doctor_id'],
+                           where="state IN ('draft', 'confirmed')")
+
     @api.depends('state')
     def _compute_color(self):
         """Set color based on state for kanban view"""
@@ -106,6 +144,12 @@ class ClinicAppointment(models.Model):
         for record in self:
             record.lab_test_count = len(record.lab_test_ids)
     
+    @api.depends('completion_job_ids.state')
+    def _compute_completion_job_state(self):
+        for appointment in self:
+            # Jobs are ordered newest first
+            appointment.completion_job_state = appointment.completion_job_ids[:1].state
+
     @api.depends('next_visit_days', 'appointment_date')
     def _compute_next_visit_date(self):
         for appointment in self:
@@ -119,15 +163,30 @@ class ClinicAppointment(models.Model):
         for vals in vals_list:
             if vals.get('name', 'New') == 'New':
                 vals['name'] = self.env['ir.sequence'].next_by_code('clinic.appointment') or 'New'
-        return super(ClinicAppointment, self).create(vals_list)
+        appointments = super(ClinicAppointment, self).create(vals_list)
+        # Appointments created directly in a booked state take their seat now
+        appointments._sync_slot_occupancy()
+        appointments._mark_daily_stats_dirty()
+        return appointments
     
     def write(self, vals):
-        # If state changes to completed, update patient's symptom
+        # Moving a booked appointment to another slot or date gives back its seat first
+        moved = self._filter_moved(vals)
+        moved._release_slot()
+        # Statistics rows of both the old and the new key need a refresh
+        stats_changed = bool(DAILY_STAT_FIELDS & vals.keys())
+        if stats_changed:
+            self._mark_daily_stats_dirty()
         result = super(ClinicAppointment, self).write(vals)
+        if stats_changed:
+            self._mark_daily_stats_dirty()
+        if 'state' in vals:
+            self._sync_slot_occupancy()
+        elif moved:
+            moved._sync_slot_occupancy()
+        # Completed visits append their symptoms to the patients' logs
         if vals.get('state') == 'completed':
-            for rec in self:
-                if rec.patient_id and rec.symptom:
-                    rec.patient_id._get_symptoms_from_appointments()
+            self.env['clinic.patient.symptom']._log_appointments(self)
         return result
 
     @api.onchange('service_id')
@@ -140,12 +199,9 @@ class ClinicAppointment(models.Model):
             return {'domain': {'doctor_id': []}}
         
         # Find doctors who have this service in their specializations
-        doctors = self.env['clinic.doctor'].search([
-            ('specialization_ids', 'in', self.service_id.id),
-            ('active', '=', True)
-        ])
+        doctor_ids = [entry[0] for entry in self.env['clinic.doctor']._get_doctors_for_service(self.service_id.id)]
         
-        domain = [('id', 'in', doctors.ids)]
+        domain = [('id', 'in', doctor_ids)]
         return {'domain': {'doctor_id': domain}}
 
     @api.onchange('doctor_id', 'appointment_date')
@@ -155,13 +211,8 @@ class ClinicAppointment(models.Model):
         if not self.doctor_id or not self.appointment_date:
             return
 
-        # Determine day of week
-        weekday = self.appointment_date.weekday()  # 0 = Monday
-        day_names = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-        day_name = day_names[weekday]
-
         # Find day record
-        day = self.env['clinic.days'].search([('name', '=', day_name)], limit=1)
+        day = self.env['clinic.days']._get_day_for_date(self.appointment_date)
         if not day:
             return
 
@@ -170,7 +221,7 @@ class ClinicAppointment(models.Model):
             return {
                 'warning': {
                     'title': 'Doctor Not Available',
-                    'message': f"Doctor {self.doctor_id.name} is not available on {day_name}"
+                    'message': f"Doctor {self.doctor_id.name} is not available on {day.name}"
                 }
             }
 
@@ -188,11 +239,7 @@ class ClinicAppointment(models.Model):
                     'message': f"Doctor {self.doctor_id.name} is on leave on {self.appointment_date.strftime('%Y-%m-%d')}"
                 }
             }
-        slots = self.env['clinic.slot'].search([
-            ('doctor_id', '=', self.doctor_id.id),
-            ('day_id', '=', day.id),
-            ('status', '=', 'available')
-        ])
+        slots = self.env['clinic.slot']._get_free_slots(self.doctor_id, self.appointment_date)
         self.slots = slots
         return {'domain': {'slot_id': [('id', 'in', slots.ids)]}}
 
@@ -201,17 +248,11 @@ class ClinicAppointment(models.Model):
     def action_confirm(self):
         """Confirm the appointment"""
         for appointment in self:
-            # Check if slot is still available
-            if appointment.slot_id.status != 'available' and appointment.state == 'draft':
-                raise ValidationError(_("The selected slot is no longer available"))
-            
-            # Update slot status
-            appointment.slot_id.status = 'booked'
-            
             # Set consulting fee if not set
             if not appointment.consulting_fee and appointment.doctor_id:
                 appointment.consulting_fee = appointment.doctor_id.consultation_fee
             
+            # Confirming reserves a seat in the slot for the appointment date
             appointment.state = 'confirmed'
     
     def action_check_in(self):
@@ -229,117 +270,158 @@ class ClinicAppointment(models.Model):
         })
     
     def action_complete(self):
-        """Complete the appointment: set state, optionally create follow-up, generate PDF from medicine_image,
-        attach it and send completion email to patient."""
-        for appointment in self:
+        """Complete the appointments, the follow-up, prescription and email are left to a background job"""
+        self.write({
+            'state': 'completed',
+            'consultation_end_time': fields.Datetime.now()
+        })
+        self.env['clinic.appointment.job']._enqueue(self)
+
+    def action_retry_completion(self):
+        """Run the failed completion jobs again"""
+        self.completion_job_ids.filtered(lambda job: job.state == 'failed').action_retry()
+
+    def _process_completion(self):
+        """Post-completion work run by the job queue: create the follow-up, attach the
+        prescription PDF and queue the completion email to the patient."""
+        self.ensure_one()
+
+        # Create follow-up appointment if needed, unless an earlier attempt already did
+        if self.next_visit_days and self.next_visit_date and not self.rescheduled_to_id:
+            self._create_followup_appointment()
+
+        attachment = self._attach_prescription()
+
+        # Queue the completion email, the mail scheduler sends it (if patient has email)
+        if self.patient_id.email:
+            template = self.env.ref('clinic_management.email_template_appointment_complete', False)
+            if template:
+                email_values = {'attachment_ids': attachment.ids} if attachment else None
+                template.send_mail(self.id, force_send=False, email_values=email_values)
+
+    def _attach_prescription(self):
+        """Return the prescription attachment, rendered unless the image did not change"""
+        self.ensure_one()
+        return self._render_prescriptions().get(self.id, self.env['ir.attachment'])
+
+    def _render_prescriptions(self):
+        """Attach the medicine images of the appointments as PDFs, rendered as one batch
+
+        The attachment is kept together with the checksum of its image, so an
+        unchanged image is never rendered twice. Images that cannot be
+        converted are attached as they are. Returns a dict of appointment ids
+        to attachments.
+        """
+        Attachment = self.env['ir.attachment']
+        sources = Attachment.search_fetch([
+            ('res_model', '=', self._name),
+            ('res_field', '=', 'medicine_image'),
+            ('res_id', 'in', self.ids),
+        ], ['res_id', 'checksum', 'mimetype'])
+
+        attachments = {}
+        to_render = {}
+        for source in sources:
+            appointment = self.browse(source.res_id)
+            if appointment.prescription_pdf_id and appointment.prescription_checksum == source.checksum:
+                attachments[appointment.id] = appointment.prescription_pdf_id
+            else:
+                to_render[appointment.id] = source
+        if not to_render:
+            return attachments
+
+        def read_sources():
+            # Read one image at a time as the pool asks for them, raw is computed for the whole prefetch set otherwise
+            for appointment_id, source in to_render.items():
+                source = source.with_prefetch()
+                raw = source.raw
+                source.invalidate_recordset(['raw', 'datas'])
+                yield appointment_id, raw
+
+        pdfs = render_pdfs(read_sources())
+        for appointment_id, source in to_render.items():
+            appointment = self.browse(appointment_id)
+            pdf = pdfs.get(appointment_id)
+            if pdf:
+                name = f"Prescription_{appointment.name or ''}.pdf"
+                if appointment.medicine_image_filename:
+                    # Replace extension with .pdf
+                    name = f"{appointment.medicine_image_filename.rsplit('.', 1)[0]}.pdf"
+                vals = {'name': name, 'raw': pdf, 'mimetype': 'application/pdf'}
+            else:
+                # Fallback: attach original image
+                vals = {
+                    'name': appointment.medicine_image_filename or f"Prescription_{appointment.name or ''}.png",
+                    'raw': source.raw,
+                    'mimetype': source.mimetype or 'image/png',
+                }
+            attachment = Attachment.create(dict(vals, type='binary', res_model=self._name, res_id=appointment.id))
             appointment.write({
-                'state': 'completed',
-                'consultation_end_time': fields.Datetime.now()
+                'prescription_pdf_id': attachment.id,
+                'prescription_checksum': source.checksum,
             })
+            attachments[appointment.id] = attachment
+        return attachments
 
-            # Create follow-up appointment if needed
-            if appointment.next_visit_days and appointment.next_visit_date:
-                appointment._create_followup_appointment()
-
-            # Prepare attachments list
-            attachment_ids = []
-
-            # If a handwritten medicine image exists, try to convert it to PDF
-            if appointment.medicine_image:
-                try:
-                    image_b = base64.b64decode(appointment.medicine_image)
-                    pdf_bytes = None
-
-                    # Try img2pdf first (fast, preserves size)
-                    try:
-                        import img2pdf
-                        pdf_bytes = img2pdf.convert(image_b)
-                    except Exception:
-                        # Fall back to Pillow
-                        try:
-                            from PIL import Image
-                            img_buf = io.BytesIO(image_b)
-                            img = Image.open(img_buf)
-                            # Ensure RGB for PDF
-                            if img.mode in ('RGBA', 'LA'):
-                                background = Image.new('RGB', img.size, (255, 255, 255))
-                                background.paste(img, mask=img.split()[-1])
-                                img = background
-                            else:
-                                img = img.convert('RGB')
-                            out_buf = io.BytesIO()
-                            img.save(out_buf, format='PDF')
-                            pdf_bytes = out_buf.getvalue()
-                        except Exception:
-                            pdf_bytes = None
-
-                    if pdf_bytes:
-                        pdf_datas = base64.b64encode(pdf_bytes)
-                        pdf_name = f"Prescription_{appointment.name or ''}.pdf"
-                        if appointment.medicine_image_filename:
-                            # Replace extension with .pdf
-                            base_name = appointment.medicine_image_filename.rsplit('.', 1)[0]
-                            pdf_name = f"{base_name}.pdf"
-                        attachment = self.env['ir.attachment'].create({
-                            'name': pdf_name,
-                            'type': 'binary',
-                            'datas': pdf_datas,
-                            'res_model': 'clinic.appointment',
-                            'res_id': appointment.id,
-                            'mimetype': 'application/pdf',
-                        })
-                        attachment_ids.append(attachment.id)
-                    else:
-                        # Fallback: attach original image
-                        img_name = appointment.medicine_image_filename or f"Prescription_{appointment.name or ''}.png"
-                        attachment = self.env['ir.attachment'].create({
-                            'name': img_name,
-                            'type': 'binary',
-                            'datas': appointment.medicine_image,
-                            'res_model': 'clinic.appointment',
-                            'res_id': appointment.id,
-                            'mimetype': 'image/png',
-                        })
-                        attachment_ids.append(attachment.id)
-
-                except Exception:
-                    logging.getLogger(__name__).exception('Failed to convert/attach medicine_image for appointment %s', appointment.id)
-
-            # Send completion email with attachments (if patient has email)
-            try:
-                if appointment.patient_id and appointment.patient_id.email:
-                    template = self.env.ref('clinic_management.email_template_appointment_complete', False)
-                    if template:
-                        # If attachments exist, pass them via context
-                        ctx = {}
-                        if attachment_ids:
-                            ctx = {'attachment_ids': attachment_ids}
-                        template.with_context(**ctx).send_mail(appointment.id, force_send=True)
-            except Exception:
-                logging.getLogger(__name__).exception('Failed to send completion email for appointment %s', appointment.id)
-    
     def action_cancel(self):
         """Cancel the appointment"""
         for appointment in self:
             if appointment.state in ['completed']:
                 raise ValidationError(_("Cannot cancel a completed appointment"))
             
+            # Cancelling frees up the seat in the slot
             appointment.write({
                 'state': 'cancelled',
             })
-            
-            # Free up the slot
-            if appointment.slot_id and appointment.slot_id.status == 'booked':
-                appointment.slot_id.status = 'available'
     
     def action_mark_no_show(self):
-        """Mark patient as no-show"""
+        """Mark patient as no-show, which frees up the seat in the slot"""
         self.write({'state': 'no_show'})
-        
-        # Free up the slot
+
+    def unlink(self):
+        self._release_slot()
+        self._mark_daily_stats_dirty()
+        return super(ClinicAppointment, self).unlink()
+
+    def _mark_daily_stats_dirty(self):
+        """Queue the daily statistics rows of these appointments for a refresh"""
+        self.env['clinic.appointment.daily.stat']._mark_dirty({
+            (appointment.company_id.id or None, appointment.doctor_id.id, appointment.appointment_date)
+            for appointment in self
+        })
+
+    def _filter_moved(self, vals):
+        """Return the appointments whose slot or date really changes with ``vals``"""
+        if 'slot_id' not in vals and 'appointment_date' not in vals:
+            return self.browse()
+        slot_id = vals.get('slot_id') or False
+        date = fields.Date.to_date(vals.get('appointment_date')) or False
+        return self.filtered(lambda a: (
+            ('slot_id' in vals and a.slot_id.id != slot_id)
+            or ('appointment_date' in vals and a.appointment_date != date)
+        ))
+
+    def _sync_slot_occupancy(self):
+        """Keep the dated slot counters in line with the appointment states"""
+        self.filtered(lambda a: a.occupancy_id and a.state not in SEAT_STATES)._release_slot()
+        self.filtered(
+            lambda a: not a.occupancy_id and a.state in SEAT_STATES and a.slot_id and a.appointment_date
+        )._reserve_slot()
+
+    def _reserve_slot(self):
+        """Take a seat in the slot on the appointment date"""
         for appointment in self:
-            if appointment.slot_id and appointment.slot_id.status == 'booked':
-                appointment.slot_id.status = 'available'
+            occupancy = appointment.slot_id._reserve(appointment.appointment_date)
+            appointment.occupancy_id = occupancy
+
+    def _release_slot(self):
+        """Give back the seat held by the appointment, if any"""
+        booked = self.filtered('occupancy_id')
+        if not booked:
+            return
+        counts = Counter(appointment.occupancy_id.id for appointment in booked)
+        self.env['clinic.slot.occupancy']._release_seats(counts)
+        booked.write({'occupancy_id': False})
     
     def action_reschedule(self):
         """Open the reschedule wizard"""
@@ -429,41 +511,19 @@ class ClinicAppointment(models.Model):
         """Create a follow-up appointment based on next visit date"""
         self.ensure_one()
         
-        # Try to find an available slot on the next visit date
-        day_name = self.next_visit_date.strftime('%A')
-        day = self.env['clinic.days'].search([('name', '=', day_name)], limit=1)
-        
-        if not day or day not in self.doctor_id.available_days:
-            # Doctor doesn't work on this da    y, can't create follow-up automatically
-            return
-        
-        # Check if doctor is on leave
-        holidays = self.env['clinic.holiday'].search([
-            ('doctor_id', '=', self.doctor_id.id),
-            ('state', '=', 'approved'),
-            ('from_date', '<=', self.next_visit_date),
-            ('to_date', '>=', self.next_visit_date)
-        ])
-        
-        if holidays:
-            # Doctor is on leave, can't create follow-up automatically
-            return
-        
-        # Find available slot
-        available_slot = self.env['clinic.slot'].search([
-            ('doctor_id', '=', self.doctor_id.id),
-            ('day_id', '=', day.id),
-            ('status', '=', 'available')
-        ], limit=1)
+        # Find a slot with a free seat on the next visit date; this also covers
+        # the doctor's working days and approved leaves
+        available_slot = self.env['clinic.slot']._get_free_slots(
+            self.doctor_id, self.next_visit_date)[:1]
         
         if not available_slot:
             # No available slots, can't create follow-up automatically
-
             return
         
         # Create follow-up appointment
         follow_up = self.create({
             'patient_id': self.patient_id.id,
+            'service_id': self.service_id.id,
             'doctor_id': self.doctor_id.id,
             'slot_id': available_slot.id,
             'appointment_date': self.next_visit_date,
@@ -577,20 +637,26 @@ class ClinicAppointment(models.Model):
         return product
     
     def _get_patient_partner(self):
-        """Get or create partner for patient"""
+        """Get or create partner for patient, it is kept on the patient for the next invoices"""
+        patient = self.patient_id
+        if patient.partner_id:
+            return patient.partner_id
+
+        phones = [phone for phone in {patient.phone, patient.phone_key} if phone]
         partner = self.env['res.partner'].search([
-            ('phone', '=', self.patient_id.phone)
+            ('phone', 'in', phones)
         ], limit=1)
         
         if not partner:
             partner = self.env['res.partner'].create({
-                'name': self.patient_id.name,
-                'phone': self.patient_id.phone,
-                'email': self.patient_id.email,
+                'name': patient.name,
+                'phone': patient.phone,
+                'email': patient.email,
                 'is_company': False,
                 'customer_rank': 1,
             })
         
+        patient.sudo().partner_id = partner
         return partner
     
     def _get_income_account(self):
@@ -607,125 +673,145 @@ class ClinicAppointment(models.Model):
         return account
 
     @api.model
-    def get_appointment_dashboard_data(self, doctor_id=None, time_filter=None):
-        """Return data for the appointment dashboard tiles"""
-        company_id = self.env.company.id
-        
-        # Build dynamic domain for appointments
-        domain = [('company_id', '=', company_id)]
+    def _get_dashboard_date_range(self, time_filter):
+        """Return the (start, end) dates of a dashboard time filter in the user's timezone"""
+        if not time_filter or time_filter == 'till_now':
+            return False, False
+
+        user_tz = self.env.user.tz or 'UTC'
+        tz = pytz.timezone(user_tz)
+        now = datetime.now(tz)
+        start_date = end_date = False
+
+        if time_filter == 'today':
+            start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
+            end_date = now.replace(hour=23, minute=59, second=59)
+        elif time_filter == 'week':
+            start_date = now - timedelta(days=now.weekday())
+            start_date = start_date.replace(hour=0, minute=0, second=0)
+            end_date = start_date + timedelta(days=6, hours=23, minutes=59)
+        elif time_filter == 'month':
+            start_date = now.replace(day=1, hour=0, minute=0, second=0)
+            next_month = (start_date + timedelta(days=31)).replace(day=1)
+            end_date = next_month - timedelta(seconds=1)
+        elif time_filter == 'year':
+            start_date = now.replace(month=1, day=1, hour=0, minute=0, second=0)
+            end_date = now.replace(month=12, day=31, hour=23, minute=59)
+
+        if not (start_date and end_date):
+            return False, False
+        utc_tz = pytz.UTC
+        return start_date.astimezone(utc_tz).date(), end_date.astimezone(utc_tz).date()
+
+    @api.model
+    def _get_dashboard_domain(self, doctor_id=None, time_filter=None, state=None):
+        """Build the appointment domain shared by the dashboard tiles and table"""
+        domain = [('company_id', '=', self.env.company.id)]
         if doctor_id:
             domain.append(('doctor_id', '=', int(doctor_id)))
-            
-        # Apply time filter
-        if time_filter:
-            user_tz = self.env.user.tz or 'UTC'
-            tz = pytz.timezone(user_tz)
-            now = datetime.now(tz)
-            
-            if time_filter == 'today':
-                start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
-                end_date = now.replace(hour=23, minute=59, second=59)
-            elif time_filter == 'week':
-                start_date = now - timedelta(days=now.weekday())
-                start_date = start_date.replace(hour=0, minute=0, second=0)
-                end_date = start_date + timedelta(days=6, hours=23, minutes=59)
-            elif time_filter == 'month':
-                start_date = now.replace(day=1, hour=0, minute=0, second=0)
-                next_month = (start_date + timedelta(days=31)).replace(day=1)
-                end_date = next_month - timedelta(seconds=1)
-            elif time_filter == 'year':
-                start_date = now.replace(month=1, day=1, hour=0, minute=0, second=0)
-                end_date = now.replace(month=12, day=31, hour=23, minute=59)
-            
-            if start_date and end_date:
-                utc_tz = pytz.UTC
-                start_date_utc = start_date.astimezone(utc_tz)
-                end_date_utc = end_date.astimezone(utc_tz)
-                domain.append(('appointment_date', '>=', start_date_utc.date()))
-                domain.append(('appointment_date', '<=', end_date_utc.date()))
-        
-        # Fetch appointments
-        appointments = self.env['clinic.appointment'].search(domain)
-        
-        # Filter by state
-        draft = appointments.filtered(lambda r: r.state == 'draft')
-        confirmed = appointments.filtered(lambda r: r.state == 'confirmed')
-        checked_in = appointments.filtered(lambda r: r.state == 'checked_in')
-        in_consultation = appointments.filtered(lambda r: r.state == 'in_consultation')
-        completed = appointments.filtered(lambda r: r.state == 'completed')
-        no_show = appointments.filtered(lambda r: r.state == 'no_show')
-        cancelled = appointments.filtered(lambda r: r.state == 'cancelled')
-        rescheduled = appointments.filtered(lambda r: r.state == 'rescheduled')
-        
-        # Calculate revenue from completed appointments
-        total_revenue = sum(completed.mapped('consulting_fee'))
+        if state:
+            domain.append(('state', '=', state))
 
-        # Count lab tests (prescription model removed; handwritten image stored on appointment)
-        total_lab_tests = sum(len(a.lab_test_ids) for a in appointments)
+        start_date, end_date = self._get_dashboard_date_range(time_filter)
+        if start_date and end_date:
+            domain.append(('appointment_date', '>=', start_date))
+            domain.append(('appointment_date', '<=', end_date))
+        return domain
 
-        return {
-            'total_appointments': len(appointments),
-            'total_draft': len(draft),
-            'total_confirmed': len(confirmed),
-            'total_checked_in': len(checked_in),
-            'total_in_consultation': len(in_consultation),
-            'total_completed': len(completed),
-            'total_no_show': len(no_show),
-            'total_cancelled': len(cancelled),
-            'total_rescheduled': len(rescheduled),
-            'total_revenue': total_revenue,
-            'total_lab_tests': total_lab_tests,
-        }
-    
     @api.model
-    def get_appointment_list_data(self, doctor_id=None, time_filter=None, state=None, offset=0, limit=15):
-        """Fetch appointment data for the dashboard table"""
-        company_id = self.env.company.id
-        
-        # Build domain
-        domain = [('company_id', '=', company_id)]
+    def _get_dashboard_stat_domain(self, doctor_id=None, time_filter=None, state=None):
+        """Same filters as ``_get_dashboard_domain``, on the daily statistics rollup"""
+        domain = [('company_id', '=', self.env.company.id)]
         if doctor_id:
             domain.append(('doctor_id', '=', int(doctor_id)))
         if state:
             domain.append(('state', '=', state))
-            
-        # Apply time filter
-        if time_filter and time_filter != 'till_now':
-            user_tz = self.env.user.tz or 'UTC'
-            tz = pytz.timezone(user_tz)
-            now = datetime.now(tz)
-            
-            if time_filter == 'today':
-                start_date = now.replace(hour=0, minute=0, second=0)
-                end_date = now.replace(hour=23, minute=59, second=59)
-            elif time_filter == 'week':
-                start_date = now - timedelta(days=now.weekday())
-                start_date = start_date.replace(hour=0, minute=0, second=0)
-                end_date = start_date + timedelta(days=6, hours=23, minutes=59)
-            elif time_filter == 'month':
-                start_date = now.replace(day=1, hour=0, minute=0, second=0)
-                next_month = (start_date + timedelta(days=31)).replace(day=1)
-                end_date = next_month - timedelta(seconds=1)
-            elif time_filter == 'year':
-                start_date = now.replace(month=1, day=1, hour=0, minute=0, second=0)
-                end_date = now.replace(month=12, day=31, hour=23, minute=59)
-                
-            if start_date and end_date:
-                utc_tz = pytz.UTC
-                start_date_utc = start_date.astimezone(utc_tz)
-                end_date_utc = end_date.astimezone(utc_tz)
-                domain.append(('appointment_date', '>=', start_date_utc.date()))
-                domain.append(('appointment_date', '<=', end_date_utc.date()))
-        
-        # Get total count
-        total_records = self.env['clinic.appointment'].search_count(domain)
-        
-        # Fetch records
-        fields = ['id', 'name', 'patient_id', 'doctor_id', 'appointment_date', 'start_time', 'end_time', 'state', 'consulting_fee']
-        appointments = self.env['clinic.appointment'].search_read(
-            domain, fields, offset=offset, limit=limit, order='appointment_date desc'
-        )
-        
+
+        start_date, end_date = self._get_dashboard_date_range(time_filter)
+        if start_date and end_date:
+            domain.append(('date', '>=', start_date))
+            domain.append(('date', '<=', end_date))
+        return domain
+
+    @api.model
+    def get_appointment_dashboard_data(self, doctor_id=None, time_filter=None):
+        """Return data for the appointment dashboard tiles"""
+        domain = self._get_dashboard_stat_domain(doctor_id, time_filter)
+
+        # Tiles read the daily rollup instead of the appointments themselves
+        totals = {
+            state: (count, revenue, lab_tests)
+            for state, count, revenue, lab_tests in self.env['clinic.appointment.daily.stat']._read_group(
+                domain, ['state'],
+                ['appointment_count:sum', 'revenue:sum', 'lab_test_count:sum'])
+        }
+
+        def state_count(state):
+            return totals.get(state, (0, 0, 0))[0] or 0
+
+        return {
+            'total_appointments': sum(count or 0 for count, _revenue, _lab_tests in totals.values()),
+            'total_draft': state_count('draft'),
+            'total_confirmed': state_count('confirmed'),
+            'total_checked_in': state_count('checked_in'),
+            'total_in_consultation': state_count('in_consultation'),
+            'total_completed': state_count('completed'),
+            'total_no_show': state_count('no_show'),
+            'total_cancelled': state_count('cancelled'),
+            'total_rescheduled': state_count('rescheduled'),
+            # Revenue comes from completed appointments only
+            'total_revenue': totals.get('completed', (0, 0, 0))[1] or 0,
+            'total_lab_tests': sum(lab_tests or 0 for _count, _revenue, lab_tests in totals.values()),
+        }
+    
+    @api.model
+    def _encode_list_cursor(self, appointment):
+        """Opaque cursor pointing at an appointment row of the dashboard table"""
+        key = [fields.Date.to_string(appointment['appointment_date']), appointment['id']]
+        return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+    @api.model
+    def _decode_list_cursor(self, cursor):
+        """Return the (appointment_date, id) key of a cursor"""
+        try:
+            date, appointment_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            return fields.Date.to_date(date), int(appointment_id)
+        except (ValueError, TypeError):
+            raise ValidationError(_("Invalid page cursor."))
+
+    @api.model
+    def get_appointment_list_data(self, doctor_id=None, time_filter=None, state=None,
+                                  cursor=None, direction='next', limit=15, with_count=True):
+        """Fetch one page of appointment data for the dashboard table
+
+        Pages are sought from ``cursor`` on (appointment_date, id) instead of
+        skipped over with an offset, so deep pages cost as much as the first.
+        """
+        domain = self._get_dashboard_domain(doctor_id, time_filter, state)
+        backward = bool(cursor) and direction == 'prev'
+        if cursor:
+            date, appointment_id = self._decode_list_cursor(cursor)
+            operator = '>' if backward else '<'
+            domain += ['|', ('appointment_date', operator, date),
+                       '&', ('appointment_date', '=', date), ('id', operator, appointment_id)]
+
+        fields_list = ['id', 'name', 'patient_id', 'doctor_id', 'appointment_date', 'start_time', 'end_time', 'state', 'consulting_fee']
+        order = 'appointment_date asc, id asc' if backward else 'appointment_date desc, id desc'
+        appointments = self.search_read(domain, fields_list, limit=limit + 1, order=order)
+        has_more = len(appointments) > limit
+        appointments = appointments[:limit]
+        if backward:
+            appointments.reverse()
+        has_next = has_more if not backward else True
+        has_prev = has_more if backward else bool(cursor)
+
+        # Approximate total from the rollup, only needed when the pager is reset
+        total_records = None
+        if with_count:
+            [(total_records,)] = self.env['clinic.appointment.daily.stat']._read_group(
+                self._get_dashboard_stat_domain(doctor_id, time_filter, state), [], ['appointment_count:sum'])
+            total_records = total_records or 0
+
         # Process records for display
         appointment_records = [{
             'id': appointment['id'],
@@ -741,6 +827,8 @@ class ClinicAppointment(models.Model):
         return {
             'total_records': total_records,
             'records': appointment_records,
+            'next_cursor': appointments and has_next and self._encode_list_cursor(appointments[-1]) or False,
+            'prev_cursor': appointments and has_prev and self._encode_list_cursor(appointments[0]) or False,
         }
     
     @api.model
@@ -0,0 +1,185 @@
+from odoo import models, fields, api
+
+STAT_DIRTY_KEY = 'clinic.appointment.daily.stat'
+
+
+class ClinicAppointmentDailyStat(models.Model):
+    _name = 'clinic.appointment.daily.stat'
+    _description = 'Daily Appointment Statistics'
+    _order = 'date desc, doctor_id, state'
+    _rec_name = 'date'
+
+    company_id = fields.Many2one('res.company', string='Company', readonly=True, index=True)
+    doctor_id = fields.Many2one('clinic.doctor', string='Doctor', readonly=True, index=True)
+    date = fields.Date(string='Date', readonly=True, index=True)
+    state = fields.Selection('_selection_state', string='Status', readonly=True)
+    appointment_count = fields.Integer(string='Appointments', readonly=True)
+    revenue = fields.Float(string='Consulting Fees', readonly=True)
+    lab_test_count = fields.Integer(string='Lab Tests', readonly=True)
+
+    _sql_constraints = [
+        ('stat_key_uniq', 'unique(company_id, doctor_id, date, state)',
+         'Only one statistics row per company, doctor, date and status!'),
+    ]
+
+    @api.model
+    def _selection_state(self):
+        return self.env['clinic.appointment']._fields['state'].selection
+
+    @api.model
+    def _mark_dirty(self, keys):
+        """Queue (company_id, doctor_id, date) keys for a refresh at the end of the transaction"""
+        keys = {key for key in keys if key[1] and key[2]}
+        if not keys:
+            return
+        precommit = self.env.cr.precommit
+        dirty = precommit.data.setdefault(STAT_DIRTY_KEY, set())
+        if not dirty:
+            stats = self.sudo()
+            precommit.add(lambda: stats._refresh(precommit.data.pop(STAT_DIRTY_KEY, set())))
+        dirty.update(keys)
+
+    @api.model
+    def _refresh(self, keys):
+        """Recompute the rows of the given (company_id, doctor_id, date) keys from the appointments"""
+        if not keys:
+            return
+        self.env['clinic.appointment'].flush_model(
+            ['company_id', 'doctor_id', 'appointment_date', 'state', 'consulting_fee'])
+        self.env['clinic.lab.test'].flush_model(['appointment_id'])
+        # Sorted so concurrent refreshes lock the shared rows in the same order
+        company_ids, doctor_ids, dates = zip(*sorted(keys, key=lambda key: (key[0] or 0, key[1], key[2])))
+        params = {
+            'company_ids': list(company_ids),
+            'doctor_ids': list(doctor_ids),
+            'dates': list(dates),
+            'uid': self.env.uid,
+        }
+        keys_query = """
+            SELECT unnest(%(company_ids)s::int[]) AS company_id,
+                   unnest(%(doctor_ids)s::int[]) AS doctor_id,
+                   unnest(%(dates)s::date[]) AS date
+        """
+        fresh_query = f"""
+            SELECT a.company_id, a.doctor_id, a.appointment_date AS date, a.state,
+                   COUNT(*) AS appointment_count, COALESCE(SUM(a.consulting_fee), 0) AS revenue,
+                   COALESCE(SUM(lt.cnt), 0) AS lab_test_count
+              FROM clinic_appointment a
+              JOIN (SELECT DISTINCT * FROM ({keys_query}) dk) k
+                ON a.company_id IS NOT DISTINCT FROM k.company_id
+               AND a.doctor_id = k.doctor_id
+               AND a.appointment_date = k.date
+              LEFT JOIN LATERAL (
+                    SELECT COUNT(*) AS cnt FROM clinic_lab_test t WHERE t.appointment_id = a.id
+              ) lt ON TRUE
+             GROUP BY a.company_id, a.doctor_id, a.appointment_date, a.state
+        """
+        cr = self.env.cr
+        # Rows are updated in place and only when their figures change, so
+        # bookings of other statuses on the same day never wait on each other
+        cr.execute(f"""
+            WITH fresh AS ({fresh_query})
+            UPDATE clinic_appointment_daily_stat s
+               SET appointment_count = f.appointment_count,
+                   revenue = f.revenue,
+                   lab_test_count = f.lab_test_count,
+                   write_uid = %(uid)s,
+                   write_date = now() at time zone 'UTC'
+              FROM fresh f
+             WHERE s.company_id IS NOT DISTINCT FROM f.company_id
+               AND s.doctor_id = f.doctor_id
+               AND s.date = f.date
+               AND s.state = f.state
+               AND (s.appointment_count, s.revenue, s.lab_test_count)
+                   IS DISTINCT FROM (f.appointment_count, f.revenue, f.lab_test_count)
+        """, params)
+        # A concurrent refresh may have added the same row since, it is
+        # updated instead of failing the transaction on the unique constraint
+        cr.execute(f"""
+            WITH fresh AS ({fresh_query})
+            INSERT INTO clinic_appointment_daily_stat AS s
+                (company_id, doctor_id, date, state, appointment_count, revenue, lab_test_count,
+                 create_uid, create_date, write_uid, write_date)
+            SELECT f.company_id, f.doctor_id, f.date, f.state,
+                   f.appointment_count, f.revenue, f.lab_test_count,
+                   %(uid)s, now() at time zone 'UTC', %(uid)s, now() at time zone 'UTC'
+              FROM fresh f
+             WHERE NOT EXISTS (
+                    SELECT 1 FROM clinic_appointment_daily_stat e
+                     WHERE e.company_id IS NOT DISTINCT FROM f.company_id
+                       AND e.doctor_id = f.doctor_id
+                       AND e.date = f.date
+                       AND e.state = f.state
+             )
+            ON CONFLICT (company_id, doctor_id, date, state) DO UPDATE
+               SET appointment_count = EXCLUDED.appointment_count,
+                   revenue = EXCLUDED.revenue,
+                   lab_test_count = EXCLUDED.lab_test_count,
+                   write_uid = EXCLUDED.write_uid,
+                   write_date = EXCLUDED.write_date
+        """, params)
+        # Statuses no appointment of the day is in anymore
+        cr.execute(f"""
+            DELETE FROM clinic_appointment_daily_stat s
+             USING ({keys_query}) k
+             WHERE s.company_id IS NOT DISTINCT FROM k.company_id
+               AND s.doctor_id = k.doctor_id
+               AND s.date = k.date
+               AND NOT EXISTS (
+                    SELECT 1 FROM clinic_appointment a
+                     WHERE a.company_id IS NOT DISTINCT FROM s.company_id
+                       AND a.doctor_id = s.doctor_id
+                       AND a.appointment_date = s.date
+                       AND a.state = s.state
+               )
+        """, params)
+        self.invalidate_model()
+
+    @api.model
+    def _rebuild(self):
+        """Recompute the whole table from the appointments"""
+        self.env['clinic.appointment'].flush_model(
+            ['company_id', 'doctor_id', 'appointment_date', 'state', 'consulting_fee'])
+        self.env['clinic.lab.test'].flush_model(['appointment_id'])
+        cr = self.env.cr
+        cr.execute("DELETE FROM clinic_appointment_daily_stat")
+        cr.execute("""
+            INSERT INTO clinic_appointment_daily_stat
+                (company_id, doctor_id, date, state, appointment_count, revenue, lab_test_count,
+                 create_uid, create_date, write_uid, write_date)
+            SELECT a.company_id, a.doctor_id, a.appointment_date, a.state,
+                   COUNT(*), COALESCE(SUM(a.consulting_fee), 0), COALESCE(SUM(lt.cnt), 0),
+                   %(uid)s, now() at time zone 'UTC', %(uid)s, now() at time zone 'UTC'
+              FROM clinic_appointment a
+              LEFT JOIN (
+                    SELECT appointment_id, COUNT(*) AS cnt
+                      FROM clinic_lab_test
+                     WHERE appointment_id IS NOT NULL
+                     GROUP BY appointment_id
+              ) lt ON lt.appointment_id = a.id
+             GROUP BY a.company_id, a.doctor_id, a.appointment_date, a.state
+        """, {'uid': self.env.uid})
+        self.invalidate_model()
+
+    @api.model
+    def _cron_refresh_daily_stats(self):
+        """Catch up on appointments and lab tests changed since the last run"""
+        ICP = self.env['ir.config_parameter'].sudo()
+        last_refresh = ICP.get_param('clinic_management.daily_stat_refreshed_at')
+        refreshed_at = fields.Datetime.now()
+
+        if not last_refresh or not self.search_count([], limit=1):
+            self._rebuild()
+        else:
+            since = fields.Datetime.to_datetime(last_refresh)
+            keys = {
+                (company.id or None, doctor.id, date)
+                for company, doctor, date in self.env['clinic.appointment']._read_group(
+                    ['|', ('write_date', '>=', since),
+                     ('lab_test_ids.write_date', '>=', since)],
+                    ['company_id', 'doctor_id', 'appointment_date:day'],
+                )
+            }
+            self._refresh({key for key in keys if key[1] and key[2]})
+
+        ICP.set_param('clinic_management.daily_stat_refreshed_at', fields.Datetime.to_string(refreshed_at))
@@ -0,0 +1,104 @@
+from odoo import models, fields, api, tools
+from datetime import timedelta
+import logging
+
+_logger = logging.getLogger(__name__)
+
+JOB_STATES = [
+    ('pending', 'Pending'),
+    ('done', 'Done'),
+    ('failed', 'Failed'),
+]
+
+# Minutes to wait before each retry, a job fails for good once they run out
+RETRY_DELAYS = (1, 5, 15, 60)
+
+
+class ClinicAppointmentJob(models.Model):
+    _name = 'clinic.appointment.job'
+    _description = 'Appointment Completion Job'
+    _order = 'id desc'
+    _rec_name = 'appointment_id'
+
+    appointment_id = fields.Many2one('clinic.appointment', string='Appointment', required=True,
+                                     readonly=True, ondelete='cascade', index=True)
+    state = fields.Selection(JOB_STATES, string='Status', default='pending', required=True, readonly=True)
+    attempts = fields.Integer(string='Attempts', readonly=True)
+    scheduled_at = fields.Datetime(string='Next Attempt', default=fields.Datetime.now,
+                                   required=True, readonly=True)
+    done_at = fields.Datetime(string='Done At', readonly=True)
+    last_error = fields.Text(string='Last Error', readonly=True)
+
+    def init(self):
+        # The cron only ever looks at the jobs that are still due
+        tools.create_index(self.env.cr, 'clinic_appointment_job_pending_index',
+                           self._table, ['scheduled_at', 'id'], where="state = 'pending'")
+
+    @api.model
+    def _enqueue(self, appointments):
+        """Queue the post-completion work of ``appointments`` and wake up the cron"""
+        jobs = self.sudo().create([{'appointment_id': appointment.id} for appointment in appointments])
+        self._trigger_cron()
+        return jobs
+
+    @api.model
+    def _trigger_cron(self):
+        cron = self.env.ref('clinic_management.ir_cron_process_appointment_jobs', raise_if_not_found=False)
+        if cron:
+            cron._trigger()
+
+    def action_retry(self):
+        """Run failed jobs again from a fresh set of attempts"""
+        self.sudo().write({
+            'state': 'pending',
+            'attempts': 0,
+            'scheduled_at': fields.Datetime.now(),
+        })
+        self._trigger_cron()
+
+    def _run(self):
+        """Run one job, a failure rolls back its own work and schedules a retry"""
+        self.ensure_one()
+        now = fields.Datetime.now()
+        attempts = self.attempts + 1
+        try:
+            with self.env.cr.savepoint():
+                self.appointment_id._process_completion()
+        except Exception as e:
+            _logger.exception('Completion job %s failed for appointment %s (attempt %s)',
+                              self.id, self.appointment_id.id, attempts)
+            vals = {'attempts': attempts, 'last_error': str(e)}
+            if attempts > len(RETRY_DELAYS):
+                vals['state'] = 'failed'
+            else:
+                vals['scheduled_at'] = now + timedelta(minutes=RETRY_DELAYS[attempts - 1])
+            self.write(vals)
+            return False
+        self.write({'state': 'done', 'attempts': attempts, 'done_at': now, 'last_error': False})
+        return True
+
+    @api.model
+    def _cron_process_jobs(self, batch_size=50):
+        """Run the due completion jobs and hand the queued emails to the mail queue"""
+        domain = [('state', '=', 'pending'), ('scheduled_at', '<=', fields.Datetime.now())]
+        jobs = self.search(domain, limit=batch_size, order='scheduled_at, id')
+
+        # Render the prescriptions of the whole batch up front, each job then
+        # finds its PDF already attached
+        try:
+            with self.env.cr.savepoint():
+                jobs.appointment_id._render_prescriptions()
+        except Exception:
+            _logger.exception('Batch prescription rendering failed, jobs render their own')
+
+        succeeded = sum(job._run() for job in jobs)
+
+        # Emails were only queued, the mail scheduler sends them in batches
+        # over a single SMTP connection
+        if succeeded:
+            mail_cron = self.env.ref('mail.ir_cron_mail_scheduler_action', raise_if_not_found=False)
+            if mail_cron:
+                mail_cron._trigger()
+
+        remaining = self.search_count(domain) if len(jobs) == batch_size else 0
+        self.env['ir.cron']._notify_progress(done=len(jobs), remaining=remaining)
@@ -1,8 +1,32 @@
-from odoo import models, fields, api
+from odoo import models, fields, api, tools
+from odoo.tools import frozendict
+import uuid
+
+# Bumped whenever content shown on the public clinic pages changes
+CONTENT_VERSION_PARAM = 'clinic_management.content_version'
+
+
+class SettingsSnapshot(frozendict):
+    """Read-only copy of the website settings, values readable as attributes"""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
 
 class ClinicWebsiteSettings(models.Model):
     _name = 'clinic.website.settings'
     _description = 'Clinic Website Settings'
+    _inherit = ['clinic.image.mixin']
+    _clinic_public_images = (
+        'banner_image_hero',
+        'clinic_image_1_card', 'clinic_image_2_card', 'clinic_image_3_card',
+        'clinic_image_4_card', 'clinic_image_5_card', 'clinic_image_6_card',
+        'treatment_image_1_card', 'treatment_image_2_card',
+        'treatment_image_3_card', 'treatment_image_4_card',
+    )
     
     name = fields.Char(string='Name', default='Website Settings')
     
@@ -11,7 +35,7 @@ class ClinicWebsiteSettings(models.Model):
     # ===================
     # Basic clinic information (auto-fetch from company)
     clinic_name = fields.Char(string='Clinic Name', help='Will be auto-filled from company details')
-    clinic_logo = fields.Binary(string='Clinic Logo', help='Upload your clinic logo')
+    clinic_logo = fields.Binary(string='Clinic Logo', help='Upload your clinic logo', attachment=True)
     address = fields.Text(string='Address', help='Complete clinic address')
     phone = fields.Char(string='Phone Number', help='Primary contact number')
     email = fields.Char(string='Email Address', help='Primary email address')
@@ -56,7 +80,9 @@ class ClinicWebsiteSettings(models.Model):
     about_us_content = fields.Html(string='About Us Content', help='Rich text content about your clinic')
     
     # Banner and Tagline
-    banner_image = fields.Binary(string='Banner Image', help='Main banner image for homepage')
+    banner_image = fields.Binary(string='Banner Image', help='Main banner image for homepage', attachment=True)
+    banner_image_hero = fields.Image(string='Banner Image (Hero)', related='banner_image',
+                                     max_width=1920, max_height=1080, store=True)
     tagline = fields.Char(string='Main Tagline', help='Main tagline displayed on banner')
     clinic_tagline = fields.Char(string='Clinic Tagline', help='Secondary tagline about your clinic')
     
@@ -74,20 +100,32 @@ class ClinicWebsiteSettings(models.Model):
     # Clinic Images Gallery (6 images)
     show_clinic_gallery = fields.Boolean(string='Show Clinic Gallery', default=True)
     clinic_images_title = fields.Char(string='Clinic Images Title', default='Our Clinic')
-    clinic_image_1 = fields.Binary(string='Clinic Image 1')
-    clinic_image_2 = fields.Binary(string='Clinic Image 2')
-    clinic_image_3 = fields.Binary(string='Clinic Image 3')
-    clinic_image_4 = fields.Binary(string='Clinic Image 4')
-    clinic_image_5 = fields.Binary(string='Clinic Image 5')
-    clinic_image_6 = fields.Binary(string='Clinic Image 6')
+    clinic_image_1 = fields.Binary(string='Clinic Image 1', attachment=True)
+    clinic_image_2 = fields.Binary(string='Clinic Image 2', attachment=True)
+    clinic_image_3 = fields.Binary(string='Clinic Image 3', attachment=True)
+    clinic_image_4 = fields.Binary(string='Clinic Image 4', attachment=True)
+    clinic_image_5 = fields.Binary(string='Clinic Image 5', attachment=True)
+    clinic_image_6 = fields.Binary(string='Clinic Image 6', attachment=True)
+    # Resized variants served to the website
+    clinic_image_1_card = fields.Image(related='clinic_image_1', max_width=512, max_height=512, store=True)
+    clinic_image_2_card = fields.Image(related='clinic_image_2', max_width=512, max_height=512, store=True)
+    clinic_image_3_card = fields.Image(related='clinic_image_3', max_width=512, max_height=512, store=True)
+    clinic_image_4_card = fields.Image(related='clinic_image_4', max_width=512, max_height=512, store=True)
+    clinic_image_5_card = fields.Image(related='clinic_image_5', max_width=512, max_height=512, store=True)
+    clinic_image_6_card = fields.Image(related='clinic_image_6', max_width=512, max_height=512, store=True)
     
     # Treatment Images (4 images)
     show_treatment_gallery = fields.Boolean(string='Show Treatment Gallery', default=True)
     treatment_images_title = fields.Char(string='Treatment Images Title', default='Our Treatments')
-    treatment_image_1 = fields.Binary(string='Treatment Image 1')
-    treatment_image_2 = fields.Binary(string='Treatment Image 2')
-    treatment_image_3 = fields.Binary(string='Treatment Image 3')
-    treatment_image_4 = fields.Binary(string='Treatment Image 4')
+    treatment_image_1 = fields.Binary(string='Treatment Image 1', attachment=True)
+    treatment_image_2 = fields.Binary(string='Treatment Image 2', attachment=True)
+    treatment_image_3 = fields.Binary(string='Treatment Image 3', attachment=True)
+    treatment_image_4 = fields.Binary(string='Treatment Image 4', attachment=True)
+    # Resized variants served to the website
+    treatment_image_1_card = fields.Image(related='treatment_image_1', max_width=512, max_height=512, store=True)
+    treatment_image_2_card = fields.Image(related='treatment_image_2', max_width=512, max_height=512, store=True)
+    treatment_image_3_card = fields.Image(related='treatment_image_3', max_width=512, max_height=512, store=True)
+    treatment_image_4_card = fields.Image(related='treatment_image_4', max_width=512, max_height=512, store=True)
     
     # Social Media Links
     show_social_media = fields.Boolean(string='Show Social Media', default=True)
@@ -274,6 +312,35 @@ class ClinicWebsiteSettings(models.Model):
             self.email = company.email
             self.website_url = company.website
 
+    @api.model
+    def _get_settings_snapshot(self):
+        """Settings as shown on the website: scalar values, image URLs and theme colors"""
+        return self._get_settings_snapshot_cached(self.env.company.id)
+
+    @tools.ormcache('company_id')
+    def _get_settings_snapshot_cached(self, company_id):
+        settings = self.sudo().search([], limit=1)
+        fnames = [
+            name for name, field in self._fields.items()
+            if field.type not in ('binary', 'one2many', 'many2many') and name not in models.MAGIC_COLUMNS
+        ]
+        if settings:
+            values = settings.read(fnames)[0]
+            stored_images = set(self.env['ir.attachment'].sudo().search([
+                ('res_model', '=', self._name),
+                ('res_id', '=', settings.id),
+                ('res_field', 'in', list(self._clinic_public_images)),
+            ]).mapped('res_field'))
+        else:
+            # Nothing configured yet, render with the defaults instead of creating a record on a GET
+            values = self.default_get(fnames)
+            values['clinic_name'] = self.env['res.company'].browse(company_id).name or 'Your Clinic Name'
+            stored_images = set()
+        for field_name in self._clinic_public_images:
+            values[field_name] = field_name in stored_images and settings._clinic_image_url(field_name)
+        values['theme_colors'] = frozendict(settings.get_theme_colors())
+        return SettingsSnapshot(values)
+
     @api.model
     def get_settings(self):
         """Get the first available website settings record or create one"""
@@ -308,4 +375,37 @@ class ClinicWebsiteSettings(models.Model):
                 if not vals.get('website_url'):
                     vals['website_url'] = company.website
         
-        return super().create(vals_list)
+        settings = super().create(vals_list)
+        self.env.registry.clear_cache()
+        self._bump_content_version()
+        return settings
+
+    def write(self, vals):
+        result = super().write(vals)
+        self.env.registry.clear_cache()
+        self._bump_content_version()
+        return result
+
+    def unlink(self):
+        result = super().unlink()
+        self.env.registry.clear_cache()
+        self._bump_content_version()
+        return result
+
+    @api.model
+    def _get_content_version(self):
+        """Version of the public page content, part of every render cache key"""
+        return self.env['ir.config_parameter'].sudo().get_param(CONTENT_VERSION_PARAM, '0')
+
+    @api.model
+    def _bump_content_version(self):
+        """Invalidate the cached public pages"""
+        self.env['ir.config_parameter'].sudo().set_param(CONTENT_VERSION_PARAM, uuid.uuid4().hex)
+
+    @api.model
+    def _get_content_cache_key(self, page):
+        """Render cache key of a public page fragment, None when it must be rendered fresh"""
+        if not self.env.user._is_public():
+            return None
+        website = self.env['website'].get_current_website()
+        return (website.id, self.env.lang, self._get_content_version(), page)
@@ -1,4 +1,7 @@
-from odoo import models, fields
+from odoo import models, fields, api, tools
+
+# Day codes in ``date.weekday()`` order, 0 = Monday
+WEEKDAY_CODES = ('MON', 'TUE', 'WED', 'THU', 'FRI', 'SAT', 'SUN')
 
 
 class ClinicDays(models.Model):
@@ -14,3 +17,34 @@ class ClinicDays(models.Model):
         ('name_uniq', 'unique(name)', 'Day name must be unique!'),
         ('code_uniq', 'unique(code)', 'Day code must be unique!')
     ]
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        days = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return days
+
+    def write(self, vals):
+        result = super().write(vals)
+        if 'code' in vals:
+            self.env.registry.clear_cache()
+        return result
+
+    def unlink(self):
+        result = super().unlink()
+        self.env.registry.clear_cache()
+        return result
+
+    @tools.ormcache()
+    def _get_weekday_map(self):
+        """Return the day ids indexed by ``date.weekday()``, matched on the day code"""
+        code_to_id = {
+            (day.code or '').upper(): day.id
+            for day in self.sudo().search([])
+        }
+        return tuple(code_to_id.get(code, False) for code in WEEKDAY_CODES)
+
+    @api.model
+    def _get_day_for_date(self, date):
+        """Return the day record of ``date``, empty if that weekday is not configured"""
+        return self.browse(self._get_weekday_map()[date.weekday()])
@@ -1,5 +1,14 @@
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
 from odoo.exceptions import ValidationError
+from collections import defaultdict
+
+# Doctor fields the cached service -> doctors index is built from
+SERVICE_INDEX_FIELDS = {'name', 'active', 'specialization_ids'}
+# Fields rendered on the public website pages
+WEBSITE_FIELDS = SERVICE_INDEX_FIELDS | {
+    'image', 'bio', 'qualification', 'consultation_fee', 'currency_id',
+    'experience_years',
+}
 
 
 class ClinicDoctorSpecialTag(models.Model):
@@ -14,11 +23,14 @@ class ClinicDoctorSpecialTag(models.Model):
 class ClinicDoctor(models.Model):
     _name = 'clinic.doctor'
     _description = 'Clinic Doctor'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'clinic.image.mixin']
     _order = 'name, id'
+    _clinic_public_images = ('image_thumb',)
     
     name = fields.Char(string='Doctor Name', required=True, tracking=True, index=True)
-    image = fields.Binary(string='Profile Image')
+    image = fields.Binary(string='Profile Image', attachment=True)
+    image_thumb = fields.Image(string='Profile Thumbnail', related='image',
+                               max_width=256, max_height=256, store=True)
     specialization_ids = fields.Many2many(
         'clinic.service', 
         string='Specializations',
@@ -114,13 +126,19 @@ class ClinicDoctor(models.Model):
     @api.model_create_multi
     def create(self, vals_list):
         doctors = super(ClinicDoctor, self).create(vals_list)
-        # Create slots for each doctor
-        for doctor in doctors:
-            doctor._create_slots()
+        # Create slots for all new doctors at once
+        doctors._create_slots()
+        self.env.registry.clear_cache()
+        self.env['clinic.website.settings']._bump_content_version()
         return doctors
     
     def write(self, vals):
         res = super(ClinicDoctor, self).write(vals)
+        if SERVICE_INDEX_FIELDS & vals.keys():
+            self.env.registry.clear_cache()
+        # Each bump clears the registry caches, only do it for what the site shows
+        if WEBSITE_FIELDS & vals.keys():
+            self.env['clinic.website.settings']._bump_content_version()
         # If availability related fields changed, update slots
         slot_related_fields = ['available_days', 'working_start_time', 'working_end_time', 
                               'slot_duration', 'max_patients_per_slot']
@@ -128,32 +146,50 @@ class ClinicDoctor(models.Model):
             self._create_slots()
         return res
     
-    def _create_slots(self):
-        """Generate slots based on doctor's availability"""
+    def unlink(self):
+        result = super(ClinicDoctor, self).unlink()
+        self.env.registry.clear_cache()
+        self.env['clinic.website.settings']._bump_content_version()
+        return result
+
+    @tools.ormcache()
+    def _get_service_doctor_index(self):
+        """Map service ids to (id, name, specializations) tuples of their active doctors"""
+        index = defaultdict(list)
+        for doctor in self.sudo().search([('active', '=', True)]):
+            entry = (doctor.id, doctor.name, ', '.join(doctor.specialization_ids.mapped('name')))
+            for service in doctor.specialization_ids:
+                index[service.id].append(entry)
+        return {service_id: tuple(entries) for service_id, entries in index.items()}
+
+    @api.model
+    def _get_doctors_for_service(self, service_id):
+        """Return the cached (id, name, specializations) tuples of the active doctors of a service"""
+        return self._get_service_doctor_index().get(service_id, ())
+
+    def _clinic_image_is_public(self):
+        return self.active
+
+    def _get_timezone(self):
+        """Timezone the doctor's slot times are expressed in"""
         self.ensure_one()
-        Slot = self.env['clinic.slot']
-        
-        # Delete existing slots that are in 'available' status only
-        # This preserves historical data of booked slots
-        existing_slots = Slot.search([
-            ('doctor_id', '=', self.id),
-            ('status', '=', 'available')
-        ])
-        existing_slots.unlink()
-        
-        # Create new slots
+        return self.user_id.tz or self.company_id.partner_id.tz or 'UTC'
+
+    def _get_slot_grid(self):
+        """Return the desired slots of the doctor as {(day id, start, end) in minutes: vals}"""
+        self.ensure_one()
+        grid = {}
+        # Convert slot_duration from string to minutes
+        slot_duration_minutes = float(self.slot_duration)
+        if slot_duration_minutes <= 0:
+            return grid
         for day in self.available_days:
             current_time = self.working_start_time
             slot_number = 1
-            
-            # Convert slot_duration from string to float
-            slot_duration_minutes = float(self.slot_duration)
-            
             while current_time + (slot_duration_minutes / 60) <= self.working_end_time:
                 end_time = current_time + (slot_duration_minutes / 60)
-                
-                # Create slot
-                slot_vals = {
+                key = (day.id, round(current_time * 60), round(end_time * 60))
+                grid[key] = {
                     'doctor_id': self.id,
                     'day_id': day.id,
                     'start_time': current_time,
@@ -163,11 +199,62 @@ class ClinicDoctor(models.Model):
                     'slot_number': f"{day.code}-{slot_number:03d}",
                     'status': 'available',
                 }
-                Slot.create(slot_vals)
-                
                 # Move to next slot
                 current_time = end_time
                 slot_number += 1
+        return grid
+
+    def _create_slots(self):
+        """Bring the doctors' slots in line with their availability, touching only what changed"""
+        Slot = self.env['clinic.slot']
+        existing_slots = Slot.search([('doctor_id', 'in', self.ids)])
+        existing_by_doctor = existing_slots.grouped('doctor_id')
+
+        vals_list = []
+        to_unlink = Slot.browse()
+        to_cancel = Slot.browse()
+        to_reopen = Slot.browse()
+        max_patients_updates = {}
+        for doctor in self:
+            grid = doctor._get_slot_grid()
+            slots = existing_by_doctor.get(doctor, Slot.browse())
+            used_numbers = set(slots.mapped('slot_number'))
+
+            for slot in slots:
+                key = (slot.day_id.id, round(slot.start_time * 60), round(slot.end_time * 60))
+                if grid.pop(key, None) is None:
+                    # Stale slot: drop it unless appointments still point at it
+                    if slot.status != 'available':
+                        continue
+                    if slot.appointment_ids:
+                        to_cancel |= slot
+                    else:
+                        to_unlink |= slot
+                    continue
+                if slot.status in ('cancelled', 'expired'):
+                    to_reopen |= slot
+                if slot.max_patients != doctor.max_patients_per_slot:
+                    max_patients_updates.setdefault(doctor.max_patients_per_slot, Slot.browse())
+                    max_patients_updates[doctor.max_patients_per_slot] |= slot
+
+            # Whatever is left in the grid is missing, number it around the slots that stay
+            for vals in grid.values():
+                if vals['slot_number'] in used_numbers:
+                    code, number = vals['slot_number'].rsplit('-', 1)
+                    number = int(number)
+                    while f"{code}-{number:03d}" in used_numbers:
+                        number += 1
+                    vals['slot_number'] = f"{code}-{number:03d}"
+                used_numbers.add(vals['slot_number'])
+                vals_list.append(vals)
+
+        to_unlink.unlink()
+        to_cancel.write({'status': 'cancelled'})
+        to_reopen.write({'status': 'available'})
+        for max_patients, slots in max_patients_updates.items():
+            slots.write({'max_patients': max_patients})
+        if vals_list:
+            Slot.with_context(tracking_disable=True).create(vals_list)
     
     def action_create_employee(self):
         """Create an employee record for this doctor"""
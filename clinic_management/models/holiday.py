@@ -1,5 +1,6 @@
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
 from odoo.exceptions import ValidationError
+from odoo.osv import expression
 
 
 class ClinicHoliday(models.Model):
@@ -25,6 +26,18 @@ class ClinicHoliday(models.Model):
     
     company_id = fields.Many2one('res.company', string='Company', 
                                  default=lambda self: self.env.company)
+    slots_released = fields.Boolean(string='Slots Released', readonly=True, copy=False,
+                                    help='Set once the expiry cron has reopened the slots blocked by this leave')
+
+    def init(self):
+        # Leave overlap checks for a doctor and date, and the expiry cron
+        tools.create_index(self.env.cr, 'clinic_holiday_doctor_state_dates_index',
+                           self._table, ['doctor_id', 'state', 'from_date', 'to_date'])
+        # Same predicate as the ORM writes for ('slots_released', '=', False),
+        # the planner only uses a partial index whose condition it can match
+        tools.create_index(self.env.cr, 'clinic_holiday_unreleased_index',
+                           self._table, ['to_date', 'id'],
+                           where="state = 'approved' AND (slots_released IS NULL OR slots_released = false)")
     
     @api.depends('doctor_id', 'from_date', 'to_date')
     def _compute_name(self):
@@ -45,7 +58,7 @@ class ClinicHoliday(models.Model):
     
     def action_approve(self):
         """Approve leave and block slots"""
-        self.write({'state': 'approved'})
+        self.write({'state': 'approved', 'slots_released': False})
         self._block_slots()
     
     def action_cancel(self):
@@ -54,86 +67,84 @@ class ClinicHoliday(models.Model):
         self._unblock_slots()
     
     def _block_slots(self):
-        """Block all slots in the leave period"""
-        for holiday in self:
-            # Get all affected days
-            current_date = holiday.from_date
-            affected_days = []
-            
-            while current_date <= holiday.to_date:
-                day_name = current_date.strftime('%A')
-                day = self.env['clinic.days'].search([('name', '=', day_name)], limit=1)
-                if day:
-                    affected_days.append((current_date, day))
-                current_date = current_date + fields.Date.to_timedelta(1)
-            
-            # Find and block slots
-            for date_day in affected_days:
-                date, day = date_day
-                slots = self.env['clinic.slot'].search([
-                    ('doctor_id', '=', holiday.doctor_id.id),
-                    ('day_id', '=', day.id),
-                    ('status', 'in', ['available']),
-                ])
-                
-                # Block slots
-                slots.write({'status': 'blocked'})
-                
-                # Handle existing appointments
-                appointments = self.env['clinic.appointment'].search([
-                    ('doctor_id', '=', holiday.doctor_id.id),
-                    ('appointment_date', '=', date),
-                    ('state', 'in', ['draft', 'confirmed']),
-                ])
-                
-                if appointments:
-                    # You could auto-reschedule here, but for now we'll just mark them
-                    # as needing rescheduling
-                    appointments.write({
-                        'state': 'cancelled',
-                        'cancellation_reason': 'Doctor unavailable due to leave'
-                    })
+        """Block the doctors' dated slots over the leave periods and cancel the affected appointments"""
+        if not self:
+            return
+        self._block_seats()
+
+        # Handle existing appointments
+        appointments = self.env['clinic.appointment'].search(expression.OR([
+            [('doctor_id', '=', holiday.doctor_id.id),
+             ('appointment_date', '>=', holiday.from_date),
+             ('appointment_date', '<=', holiday.to_date),
+             ('state', 'in', ['draft', 'confirmed'])]
+            for holiday in self
+        ]))
+        if appointments:
+            # You could auto-reschedule here, but for now we'll just mark them
+            # as needing rescheduling
+            appointments.with_context(tracking_disable=True).write({
+                'state': 'cancelled',
+                'cancellation_reason': 'Doctor unavailable due to leave'
+            })
     
-    def _unblock_slots(self):
-        """Unblock slots if leave is cancelled"""
+    def _block_seats(self):
+        """Block the doctors' dated slots over the leave periods"""
+        Days = self.env['clinic.days']
+        slots = self.env['clinic.slot'].search([
+            ('doctor_id', 'in', self.doctor_id.ids),
+            ('status', '=', 'available'),
+        ])
+        slots_by_day = {}
+        for slot in slots:
+            slots_by_day.setdefault((slot.doctor_id.id, slot.day_id.id), []).append(slot.id)
+
+        # One (slot, date) pair per seat row to block, the first leave covering it wins
+        blocked = {}
         for holiday in self:
-            # Get all affected days
             current_date = holiday.from_date
-            affected_days = []
-            
             while current_date <= holiday.to_date:
-                day_name = current_date.strftime('%A')
-                day = self.env['clinic.days'].search([('name', '=', day_name)], limit=1)
-                if day:
-                    affected_days.append((current_date, day))
+                day = Days._get_day_for_date(current_date)
+                for slot_id in slots_by_day.get((holiday.doctor_id.id, day.id), ()):
+                    blocked.setdefault((slot_id, current_date), holiday.id)
                 current_date = current_date + fields.Date.to_timedelta(1)
-            
-            # Find and unblock slots
-            for date_day in affected_days:
-                date, day = date_day
-                slots = self.env['clinic.slot'].search([
-                    ('doctor_id', '=', holiday.doctor_id.id),
-                    ('day_id', '=', day.id),
-                    ('status', '=', 'blocked'),
-                ])
-                
-                # Unblock slots
-                slots.write({'status': 'available'})
+
+        if blocked:
+            self.env['clinic.slot.occupancy']._block_seats(blocked)
+
+    def _unblock_slots(self):
+        """Reopen the dated slots these leaves blocked"""
+        if not self:
+            return
+        self.env['clinic.slot.occupancy']._unblock_seats(self)
+        # Dates still covered by another approved leave stay blocked
+        others = self.search([
+            ('id', 'not in', self.ids),
+            ('doctor_id', 'in', self.doctor_id.ids),
+            ('state', '=', 'approved'),
+            ('from_date', '<=', max(self.mapped('to_date'))),
+            ('to_date', '>=', min(self.mapped('from_date'))),
+        ])
+        others._block_slots()
     
     @api.model
-    def _cron_unblock_expired_leaves(self):
+    def _cron_unblock_expired_leaves(self, batch_size=500):
         """Cron job to unblock slots for expired leaves"""
-        expired_leaves = self.search([
+        domain = [
             ('to_date', '<', fields.Date.today()),
-            ('state', '=', 'approved')
-        ])
-        
-        for leave in expired_leaves:
-            # Find blocked slots for this leave
-            slots = self.env['clinic.slot'].search([
-                ('doctor_id', '=', leave.doctor_id.id),
-                ('status', '=', 'blocked')
-            ])
-            
-            # Unblock slots
-            slots.write({'status': 'available'})
+            ('state', '=', 'approved'),
+            ('slots_released', '=', False),
+        ]
+        expired_leaves = self.search(domain, limit=batch_size, order='to_date, id')
+        if not expired_leaves:
+            return
+
+        # Only the rows each leave blocked itself are reopened
+        self.env['clinic.slot.occupancy']._unblock_seats(expired_leaves)
+        expired_leaves.write({'slots_released': True})
+
+        # The cron commits this batch and runs again while leaves remain
+        self.env['ir.cron']._notify_progress(
+            done=len(expired_leaves),
+            remaining=self.search_count(domain),
+        )
@@ -0,0 +1,26 @@
+from odoo import models
+import hashlib
+
+
+class ClinicImageMixin(models.AbstractModel):
+    _name = 'clinic.image.mixin'
+    _description = 'Clinic Public Image URLs'
+
+    # Image fields the public site may request through /clinic/image
+    _clinic_public_images = ()
+
+    def _clinic_image_url(self, field_name):
+        """URL of a resized image variant, versioned so browsers can cache it forever"""
+        self.ensure_one()
+        unique = hashlib.sha256(str(self.write_date).encode()).hexdigest()[:7]
+        return f'/clinic/image/{self._name}/{self.id}/{field_name}?unique={unique}'
+
+    def _clinic_has_image(self, field_name):
+        """Whether the image is set, read as its size so the content is not loaded"""
+        self.ensure_one()
+        return bool(self.with_context(bin_size=True)[field_name])
+
+    def _clinic_image_is_public(self):
+        """Whether the record's images may be shown to website visitors"""
+        self.ensure_one()
+        return True
@@ -1,4 +1,4 @@
-from odoo import models, fields
+from odoo import models, fields, api
 
 
 class ClinicLabTest(models.Model):
@@ -9,11 +9,11 @@ class ClinicLabTest(models.Model):
     name = fields.Char(string='Test Name', required=True)
     patient_id = fields.Many2one('clinic.patient', string='Patient', required=True)
     doctor_id = fields.Many2one('clinic.doctor', string='Doctor', required=True)
-    appointment_id = fields.Many2one('clinic.appointment', string='Appointment')
+    appointment_id = fields.Many2one('clinic.appointment', string='Appointment', index=True)
     test_date = fields.Date(string='Date', default=fields.Date.context_today)
     notes = fields.Text(string='Notes')
     result = fields.Text(string='Result')
-    result_document = fields.Binary(string='Result Document')
+    result_document = fields.Binary(string='Result Document', attachment=True)
     result_document_filename = fields.Char(string='Result Document Filename')
 
     state = fields.Selection([
@@ -25,6 +25,25 @@ class ClinicLabTest(models.Model):
     company_id = fields.Many2one('res.company', string='Company', 
                                  default=lambda self: self.env.company)
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        lab_tests = super().create(vals_list)
+        lab_tests.appointment_id._mark_daily_stats_dirty()
+        return lab_tests
+
+    def write(self, vals):
+        # Lab test counts move between appointments, refresh both sides
+        if 'appointment_id' in vals:
+            self.appointment_id._mark_daily_stats_dirty()
+        result = super().write(vals)
+        if 'appointment_id' in vals:
+            self.appointment_id._mark_daily_stats_dirty()
+        return result
+
+    def unlink(self):
+        self.appointment_id._mark_daily_stats_dirty()
+        return super().unlink()
+
     def action_complete(self):
         self.write({'state': 'completed'})
 
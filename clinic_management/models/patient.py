@@ -1,6 +1,45 @@
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
 from odoo.exceptions import ValidationError
 from odoo.tools.translate import trans_export, trans_export_records
+import logging
+import re
+
+from .patient_symptom import RECENT_SYMPTOM_LIMIT
+
+try:
+    import phonenumbers
+except ImportError:
+    phonenumbers = None
+
+_logger = logging.getLogger(__name__)
+
+# Fields a merged patient takes over from its duplicates when it has no value
+PATIENT_MERGE_FIELDS = ('email', 'address', 'gender', 'age', 'has_medical_history',
+                        'medical_report', 'medical_report_filename', 'partner_id')
+
+
+def normalize_phone(phone, country=None):
+    """Return ``phone`` in E.164 form, numbers without a country code are read in ``country``"""
+    if not phone or not phone.strip():
+        return False
+    if phonenumbers:
+        try:
+            number = phonenumbers.parse(phone, country.code if country else None)
+            if phonenumbers.is_possible_number(number):
+                return phonenumbers.format_number(number, phonenumbers.PhoneNumberFormat.E164)
+        except phonenumbers.NumberParseException:
+            pass
+    # Digits only, with the international or the country prefix
+    digits = re.sub(r'\D', '', phone)
+    if not digits:
+        return False
+    if phone.strip().startswith('+'):
+        return f'+{digits}'
+    if digits.startswith('00'):
+        return f'+{digits[2:]}'
+    if country and country.phone_code:
+        return f'+{country.phone_code}{digits.lstrip("0")}'
+    return digits
 
 
 
@@ -17,27 +56,34 @@ class ClinicPatient(models.Model):
         ('other', 'Other')
     ], string='Gender', tracking=True)
     age = fields.Integer(string='Age', tracking=True)
-    phone = fields.Char(string='Phone', tracking=True)
+    phone = fields.Char(string='Phone', tracking=True, index=True)
+    phone_key = fields.Char(string='Normalized Phone', compute='_compute_phone_key', store=True,
+                            help='Phone number in E.164 form, family members may share it')
     email = fields.Char(string='Email', tracking=True)
     address = fields.Text(string='Address')
     
     has_medical_history = fields.Boolean(string='Has Medical History')
-    medical_report = fields.Binary(string='Medical Report')
+    medical_report = fields.Binary(string='Medical Report', attachment=True)
     medical_report_filename = fields.Char(string='Medical Report Filename')
     
-    symptom = fields.Text(string='Symptoms', readonly=True,
-                         help='Symptoms as reported during appointments')
+    symptom_ids = fields.One2many('clinic.patient.symptom', 'patient_id', string='Symptom History')
+    recent_symptom_ids = fields.Many2many('clinic.patient.symptom', string='Recent Symptoms',
+                                          compute='_compute_recent_symptom_ids',
+                                          help='Symptoms as reported during the latest appointments')
     
     active = fields.Boolean(string='Active', default=True)
     company_id = fields.Many2one('res.company', string='Company', 
                                  default=lambda self: self.env.company)
+    partner_id = fields.Many2one('res.partner', string='Contact', readonly=True, copy=False,
+                                 index='btree_not_null')
     
     # Related records
     lab_test_ids = fields.One2many('clinic.lab.test', 'patient_id', string='Lab Tests')
     appointment_ids = fields.One2many('clinic.appointment', 'patient_id', string='Appointments')
     
-    appointment_count = fields.Integer(string='Appointment Count', compute='_compute_counts')
-    lab_test_count = fields.Integer(string='Lab Test Count', compute='_compute_counts')
+    # Stored so list and kanban views read them without touching the histories
+    appointment_count = fields.Integer(string='Appointment Count', compute='_compute_appointment_count', store=True)
+    lab_test_count = fields.Integer(string='Lab Test Count', compute='_compute_lab_test_count', store=True)
 
     # ticket reports
 
@@ -46,19 +92,99 @@ class ClinicPatient(models.Model):
         """Get available languages from the system"""
         return self.env['res.lang'].get_installed()
     
-    @api.depends('appointment_ids', 'lab_test_ids')
-    def _compute_counts(self):
+    def init(self):
+        # Booking lookups, a number may be shared by several patients
+        tools.create_index(self.env.cr, 'clinic_patient_company_phone_key_index',
+                           self._table, ['company_id', 'phone_key'])
+
+    @api.depends('phone', 'company_id.country_id')
+    def _compute_phone_key(self):
+        for patient in self:
+            patient.phone_key = normalize_phone(patient.phone, patient.company_id.country_id)
+
+    @api.model
+    def _find_by_phone(self, phone, name):
+        """Return the patient of the current company with the same phone number, whatever its
+        format, and the same name, family members sharing a number stay separate patients"""
+        company = self.env.company
+        phone_key = normalize_phone(phone, company.country_id)
+        name_key = ' '.join((name or '').split()).casefold()
+        if not phone_key or not name_key:
+            return self.browse()
+        patients = self.with_context(active_test=False).search([
+            ('company_id', '=', company.id),
+            ('phone_key', '=', phone_key),
+        ], order='id')
+        return patients.filtered(lambda patient: ' '.join(patient.name.split()).casefold() == name_key)[:1]
+
+    def _merge_from(self, duplicates):
+        """Move the history of ``duplicates`` to this patient and delete them"""
+        self.ensure_one()
+        vals = {}
+        newest_first = duplicates.sorted('id', reverse=True)
+        for fname in PATIENT_MERGE_FIELDS:
+            if not self[fname]:
+                value = next((dup[fname] for dup in newest_first if dup[fname]), False)
+                if value:
+                    vals[fname] = self._fields[fname].convert_to_write(value, self)
+
+        appointments = duplicates.appointment_ids
+        appointments.with_context(tracking_disable=True).write({'patient_id': self.id})
+        duplicates.lab_test_ids.with_context(tracking_disable=True).write({'patient_id': self.id})
+        # The duplicates' symptom logs go with them, replay their visits into this one
+        self.env['clinic.patient.symptom']._log_appointments(
+            appointments.filtered(lambda appointment: appointment.state == 'completed'))
+        self.env['mail.message'].sudo().search([
+            ('model', '=', self._name),
+            ('res_id', 'in', duplicates.ids),
+        ]).write({'res_id': self.id})
+
+        duplicates.unlink()
+        if vals:
+            self.write(vals)
+
+    def action_merge_patients(self):
+        """Merge the selected patients into the oldest one, once a user has checked they are
+        the same person"""
+        if len(self) < 2:
+            raise ValidationError(_("Select at least two patients to merge."))
+        if len(self.company_id) > 1 or len(set(self.mapped('phone_key'))) > 1:
+            raise ValidationError(_("Only patients of the same company with the same phone number can be merged."))
+        patients = self.with_context(active_test=False).sorted('id')
+        patients[0]._merge_from(patients[1:])
+        _logger.info("Merged patients %s into %s", patients[1:].ids, patients[0].id)
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'type': 'success',
+                'message': _("%(count)s patients merged into %(name)s",
+                             count=len(patients) - 1, name=patients[0].name),
+                'next': {'type': 'ir.actions.client', 'tag': 'reload'},
+            },
+        }
+
+    @api.depends('appointment_ids')
+    def _compute_appointment_count(self):
+        counts = dict(self.env['clinic.appointment']._read_group(
+            [('patient_id', 'in', self.ids)], ['patient_id'], ['__count']))
+        for patient in self:
+            patient.appointment_count = counts.get(patient, 0)
+
+    @api.depends('lab_test_ids')
+    def _compute_lab_test_count(self):
+        counts = dict(self.env['clinic.lab.test']._read_group(
+            [('patient_id', 'in', self.ids)], ['patient_id'], ['__count']))
         for patient in self:
-            patient.appointment_count = len(patient.appointment_ids)
-            patient.lab_test_count = len(patient.lab_test_ids)
-            patient.lab_test_count = len(patient.lab_test_ids)
+            patient.lab_test_count = counts.get(patient, 0)
     
-    def _get_symptoms_from_appointments(self):
-        """Update symptom field based on appointment data"""
+    @api.depends('symptom_ids')
+    def _compute_recent_symptom_ids(self):
+        """Only the latest entries of the log, however long the history"""
+        Symptom = self.env['clinic.patient.symptom']
         for patient in self:
-            symptoms = patient.appointment_ids.filtered(lambda a: a.symptom).mapped('symptom')
-            if symptoms:
-                patient.symptom = '\n'.join(symptoms)
+            patient.recent_symptom_ids = Symptom.search(
+                [('patient_id', '=', patient._origin.id)], limit=RECENT_SYMPTOM_LIMIT)
     
     def action_view_appointments(self):
         self.ensure_one()
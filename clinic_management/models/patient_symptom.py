@@ -0,0 +1,102 @@
+from odoo import models, fields, api, tools
+import hashlib
+
+# Entries shown in a patient's recent symptoms
+RECENT_SYMPTOM_LIMIT = 10
+
+
+class ClinicPatientSymptom(models.Model):
+    _name = 'clinic.patient.symptom'
+    _description = 'Patient Symptom Log'
+    _order = 'last_seen desc, id desc'
+    _rec_name = 'symptom'
+
+    patient_id = fields.Many2one('clinic.patient', string='Patient', required=True,
+                                 readonly=True, ondelete='cascade')
+    symptom = fields.Text(string='Symptoms', required=True, readonly=True)
+    symptom_key = fields.Char(string='Symptom Key', required=True, readonly=True,
+                              help='Digest of the normalized text, repeated symptoms share one entry')
+    first_seen = fields.Date(string='First Reported', readonly=True)
+    last_seen = fields.Date(string='Last Reported', readonly=True)
+    occurrences = fields.Integer(string='Visits', default=1, readonly=True)
+    appointment_id = fields.Many2one('clinic.appointment', string='Last Appointment',
+                                     readonly=True, ondelete='set null')
+
+    _sql_constraints = [
+        ('patient_symptom_uniq', 'unique(patient_id, symptom_key)',
+         'A symptom is only logged once per patient!'),
+    ]
+
+    def init(self):
+        # Recent symptoms of a patient, newest first
+        tools.create_index(self.env.cr, 'clinic_patient_symptom_recent_index',
+                           self._table, ['patient_id', 'last_seen DESC', 'id DESC'])
+
+    @api.model
+    def _get_symptom_key(self, symptom):
+        return hashlib.md5(' '.join(symptom.split()).lower().encode()).hexdigest()
+
+    @api.model
+    def _log_appointments(self, appointments):
+        """Append the symptoms of ``appointments`` to their patients' logs in one statement
+
+        A symptom already logged for the patient only has its last visit and
+        visit count updated.
+        """
+        entries = {}
+        for appointment in appointments.sorted(lambda a: (a.appointment_date, a.id)):
+            symptom = (appointment.symptom or '').strip()
+            if not appointment.patient_id or not symptom:
+                continue
+            key = (appointment.patient_id.id, self._get_symptom_key(symptom))
+            entry = entries.get(key)
+            if entry:
+                entry.update(last_seen=appointment.appointment_date, appointment_id=appointment.id)
+                entry['occurrences'] += 1
+            else:
+                entries[key] = {
+                    'symptom': symptom,
+                    'first_seen': appointment.appointment_date,
+                    'last_seen': appointment.appointment_date,
+                    'appointment_id': appointment.id,
+                    'occurrences': 1,
+                }
+        if not entries:
+            return
+
+        self.flush_model()
+        keys = list(entries)
+        self.env.cr.execute("""
+            INSERT INTO clinic_patient_symptom AS s
+                (patient_id, symptom_key, symptom, first_seen, last_seen, occurrences, appointment_id,
+                 create_uid, create_date, write_uid, write_date)
+            SELECT k.patient_id, k.symptom_key, k.symptom, k.first_seen, k.last_seen, k.occurrences,
+                   k.appointment_id,
+                   %(uid)s, now() at time zone 'UTC', %(uid)s, now() at time zone 'UTC'
+              FROM unnest(%(patient_ids)s::int[], %(symptom_keys)s::varchar[], %(symptoms)s::text[],
+                          %(first_seen)s::date[], %(last_seen)s::date[], %(occurrences)s::int[],
+                          %(appointment_ids)s::int[])
+                   AS k(patient_id, symptom_key, symptom, first_seen, last_seen, occurrences, appointment_id)
+            ON CONFLICT (patient_id, symptom_key) DO UPDATE
+               SET first_seen = LEAST(s.first_seen, EXCLUDED.first_seen),
+                   last_seen = GREATEST(s.last_seen, EXCLUDED.last_seen),
+                   -- completing the same appointment again is not a new visit
+                   occurrences = s.occurrences + CASE WHEN s.appointment_id = EXCLUDED.appointment_id
+                                                      THEN 0 ELSE EXCLUDED.occurrences END,
+                   appointment_id = CASE WHEN EXCLUDED.last_seen >= s.last_seen OR s.last_seen IS NULL
+                                         THEN EXCLUDED.appointment_id ELSE s.appointment_id END,
+                   write_uid = EXCLUDED.write_uid,
+                   write_date = EXCLUDED.write_date
+        """, {
+            'uid': self.env.uid,
+            'patient_ids': [patient_id for patient_id, _key in keys],
+            'symptom_keys': [key for _patient_id, key in keys],
+            'symptoms': [entries[key]['symptom'] for key in keys],
+            'first_seen': [entries[key]['first_seen'] for key in keys],
+            'last_seen': [entries[key]['last_seen'] for key in keys],
+            'occurrences': [entries[key]['occurrences'] for key in keys],
+            'appointment_ids': [entries[key]['appointment_id'] for key in keys],
+        })
+        self.invalidate_model()
+        self.env['clinic.patient'].browse({patient_id for patient_id, _key in keys}).invalidate_recordset(
+            ['symptom_ids', 'recent_symptom_ids'])
@@ -1,14 +1,20 @@
 from odoo import models, fields, api, _
 
+# Fields rendered on the public website pages
+WEBSITE_FIELDS = {'name', 'description', 'icon', 'icon_thumb', 'active'}
+
 
 class ClinicService(models.Model):
     _name = 'clinic.service'
     _description = 'Clinic Services/Treatments'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'clinic.image.mixin']
+    _clinic_public_images = ('icon_thumb',)
     
     name = fields.Char(string='Service Name', required=True, tracking=True)
     description = fields.Html(string='Description')  # Removed tracking as it's not supported for HTML fields
-    icon = fields.Binary(string='Service Icon/Image')
+    icon = fields.Binary(string='Service Icon/Image', attachment=True)
+    icon_thumb = fields.Image(string='Service Icon Thumbnail', related='icon',
+                              max_width=128, max_height=128, store=True)
     active = fields.Boolean(string='Active', default=True, tracking=True)
     company_id = fields.Many2one('res.company', string='Company', 
                                  default=lambda self: self.env.company)
@@ -18,12 +24,37 @@ class ClinicService(models.Model):
     
     appointment_count = fields.Integer(string='Appointment Count', compute='_compute_appointment_count')
     
+    @api.model_create_multi
+    def create(self, vals_list):
+        services = super().create(vals_list)
+        self.env['clinic.website.settings']._bump_content_version()
+        return services
+
+    def write(self, vals):
+        result = super().write(vals)
+        # Service names and visibility feed the cached service -> doctors index
+        if 'name' in vals or 'active' in vals:
+            self.env.registry.clear_cache()
+        # Each bump clears the registry caches, only do it for what the site shows
+        if WEBSITE_FIELDS & vals.keys():
+            self.env['clinic.website.settings']._bump_content_version()
+        return result
+
+    def unlink(self):
+        result = super().unlink()
+        self.env.registry.clear_cache()
+        self.env['clinic.website.settings']._bump_content_version()
+        return result
+
+    def _clinic_image_is_public(self):
+        return self.active
+
     def _compute_appointment_count(self):
-        """Compute the number of appointments for this service"""
+        """Compute the number of appointments of all services in one grouped query"""
+        counts = dict(self.env['clinic.appointment']._read_group(
+            [('service_id', 'in', self.ids)], ['service_id'], ['__count']))
         for service in self:
-            service.appointment_count = self.env['clinic.appointment'].search_count([
-                ('service_id', '=', service.id)
-            ])
+            service.appointment_count = counts.get(service, 0)
     
     def action_view_appointments(self):
         """Action to view appointments related to this service"""
@@ -1,5 +1,11 @@
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
 from odoo.exceptions import ValidationError
+from collections import defaultdict
+from datetime import datetime, timedelta
+import pytz
+
+# Longest date range the booking calendar may ask availability for
+MAX_AVAILABILITY_DAYS = 62
 
 
 class ClinicSlot(models.Model):
@@ -29,6 +35,7 @@ class ClinicSlot(models.Model):
 
     
     appointment_ids = fields.One2many('clinic.appointment', 'slot_id', string='Appointments')
+    occupancy_ids = fields.One2many('clinic.slot.occupancy', 'slot_id', string='Occupancy')
     
     color = fields.Integer(string='Color', compute='_compute_color')
     
@@ -38,6 +45,18 @@ class ClinicSlot(models.Model):
     ]
     display_name = fields.Char(compute='_compute_display_name', store=False)
 
+    def init(self):
+        # Free-slot lookups filter a doctor's weekday templates by status
+        tools.create_index(self.env.cr, 'clinic_slot_doctor_day_status_index',
+                           self._table, ['doctor_id', 'day_id', 'status'])
+
+    def write(self, vals):
+        res = super().write(vals)
+        # Upcoming dated rows follow the new capacity, full ones may reopen
+        if 'max_patients' in vals:
+            self.env['clinic.slot.occupancy']._update_capacity(self)
+        return res
+
     @api.depends('start_time', 'end_time', 'day_id.name')
     def _compute_display_name(self):
         def fmt(t):
@@ -66,13 +85,16 @@ class ClinicSlot(models.Model):
             else:
                 slot.color = 0   # Grey
     
-    @api.depends('appointment_ids')
+    @api.depends_context('occupancy_date')
     def _compute_current_patients(self):
-        """Compute the number of patients currently booked in this slot"""
+        """Read the booked seats of the date in context (today by default) from the occupancy counters"""
+        date = self.env.context.get('occupancy_date') or fields.Date.context_today(self)
+        booked = dict(self.env['clinic.slot.occupancy']._read_group(
+            [('slot_id', 'in', self.ids), ('date', '=', date)],
+            ['slot_id'], ['booked_count:sum'],
+        ))
         for slot in self:
-            slot.current_patients = len(slot.appointment_ids.filtered(
-                lambda a: a.state not in ['cancelled', 'no_show']
-            ))
+            slot.current_patients = booked.get(slot, 0)
     
     @api.constrains('start_time', 'end_time')
     def _check_times(self):
@@ -80,18 +102,101 @@ class ClinicSlot(models.Model):
             if slot.start_time >= slot.end_time:
                 raise ValidationError(_("End Time must be greater than Start Time"))
     
-    @api.constrains('current_patients', 'max_patients')
-    def _check_capacity(self):
-        for slot in self:
-            if slot.current_patients > slot.max_patients:
-                raise ValidationError(_("Cannot exceed maximum patient capacity for this slot"))
-
     def _float_time_convert(self, float_time):
         """Convert float time to formatted string (HH:MM)"""
         hours = int(float_time)
         minutes = int((float_time - hours) * 60)
         return f"{hours:02d}:{minutes:02d}"
     
+    def _reserve(self, date):
+        """Reserve one seat of this slot on ``date`` and return the occupancy record"""
+        self.ensure_one()
+        if self.status != 'available':
+            raise ValidationError(_("The selected slot is no longer available"))
+        occupancy = self.env['clinic.slot.occupancy']._reserve_seat(self, date)
+        if not occupancy:
+            raise ValidationError(_("The selected slot is no longer available"))
+        return occupancy
+
+    @api.model
+    def _get_free_slots(self, doctor, date):
+        """Return the template slots of ``doctor`` that still have a free seat on ``date``"""
+        day = self.env['clinic.days']._get_day_for_date(date)
+        if not day or day not in doctor.available_days:
+            return self.browse()
+
+        holidays = self.env['clinic.holiday'].search_count([
+            ('doctor_id', '=', doctor.id),
+            ('state', '=', 'approved'),
+            ('from_date', '<=', date),
+            ('to_date', '>=', date)
+        ])
+        if holidays:
+            return self.browse()
+
+        slots = self.search([
+            ('doctor_id', '=', doctor.id),
+            ('day_id', '=', day.id),
+            ('status', '=', 'available')
+        ], order='start_time')
+        taken = self.env['clinic.slot.occupancy'].search([
+            ('slot_id', 'in', slots.ids),
+            ('date', '=', date),
+            ('state', '!=', 'open')
+        ])
+        return slots - taken.slot_id
+
+    @api.model
+    def _get_availability(self, doctor, date_from, date_to):
+        """Return the free slots of ``doctor`` for every date from ``date_from`` to ``date_to``
+
+        Working days, approved leaves and dated occupancy are loaded once for
+        the whole range, so the cost does not grow with the number of dates.
+        """
+        date_to = min(date_to, date_from + timedelta(days=MAX_AVAILABILITY_DAYS - 1))
+        slots = self.search([
+            ('doctor_id', '=', doctor.id),
+            ('status', '=', 'available')
+        ], order='start_time')
+        slots_by_day = slots.grouped('day_id')
+
+        holidays = self.env['clinic.holiday'].search([
+            ('doctor_id', '=', doctor.id),
+            ('state', '=', 'approved'),
+            ('from_date', '<=', date_to),
+            ('to_date', '>=', date_from)
+        ])
+
+        taken = defaultdict(set)
+        for occupancy in self.env['clinic.slot.occupancy'].search_fetch([
+            ('slot_id', 'in', slots.ids),
+            ('date', '>=', date_from),
+            ('date', '<=', date_to),
+            ('state', '!=', 'open')
+        ], ['slot_id', 'date']):
+            taken[occupancy.date].add(occupancy.slot_id.id)
+
+        today = fields.Date.context_today(self)
+        Days = self.env['clinic.days']
+        days = []
+        date = date_from
+        while date <= date_to:
+            day = Days._get_day_for_date(date)
+            day_slots = self.browse()
+            if date >= today and day in doctor.available_days and not any(
+                    holiday.from_date <= date <= holiday.to_date for holiday in holidays):
+                day_slots = slots_by_day.get(day, self.browse())
+            free_slot_ids = [slot.id for slot in day_slots if slot.id not in taken[date]]
+            days.append({
+                'date': fields.Date.to_string(date),
+                'status': 'free' if free_slot_ids else ('full' if day_slots else 'unavailable'),
+                'total_slots': len(day_slots),
+                'free_slots': len(free_slot_ids),
+                'free_slot_ids': free_slot_ids,
+            })
+            date += timedelta(days=1)
+        return {'slots': slots, 'days': days}
+
     def action_set_available(self):
         """Set slot status to Available"""
         self.write({'status': 'available'})
@@ -111,37 +216,32 @@ class ClinicSlot(models.Model):
             slot.status = 'cancelled'
     
     @api.model
-    def _cron_expire_past_slots(self):
-        """Cron job to mark past slots as expired"""
-        import datetime
-        today = fields.Date.today()
-        weekday = today.weekday()  # 0 = Monday, 6 = Sunday
-        
-        # Map weekday to day name
-        day_names = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-        day_name = day_names[weekday]
-        
-        # Find day record
-        day = self.env['clinic.days'].search([('name', '=', day_name)], limit=1)
-        
-        if not day:
-            return
-        
-        # Current time as float
-        now = datetime.datetime.now()
-        current_time_float = now.hour + now.minute / 60
-        
-        # Expire slots for today that are in the past
-        slots_to_expire = self.search([
-            ('day_id', '=', day.id),
-            ('end_time', '<', current_time_float),
-            ('status', 'in', ['available', 'booked'])
-        ])
-        
-        # Mark as expired
-        slots_to_expire.write({'status': 'expired'})
-        
-        # Handle no-shows for booked appointments
-        for slot in slots_to_expire.filtered(lambda s: s.appointment_ids):
-            for appointment in slot.appointment_ids.filtered(lambda a: a.state in ['confirmed']):
-                appointment.write({'state': 'no_show'})
+    def _cron_expire_past_slots(self, batch_size=1000):
+        """Cron job to expire past dated slots and mark missed appointments as no-show"""
+        Appointment = self.env['clinic.appointment']
+        done = remaining = 0
+
+        # "Past" is decided in each doctor's own timezone, archived doctors'
+        # bookings expire as well
+        doctors = self.env['clinic.doctor'].with_context(active_test=False).search([])
+        for tz_name, tz_doctors in doctors.grouped(lambda doctor: doctor._get_timezone()).items():
+            now = datetime.now(pytz.timezone(tz_name))
+            today = now.date()
+            current_time = now.hour + now.minute / 60
+
+            domain = [
+                ('doctor_id', 'in', tz_doctors.ids),
+                ('state', '=', 'confirmed'),
+                '|', ('appointment_date', '<', today),
+                '&', ('appointment_date', '=', today), ('end_time', '<', current_time),
+            ]
+            appointments = Appointment.search(domain, limit=batch_size, order='appointment_date, id')
+            appointments.with_context(tracking_disable=True).write({'state': 'no_show'})
+            done += len(appointments)
+            if len(appointments) == batch_size:
+                remaining += Appointment.search_count(domain)
+
+            self.env['clinic.slot.occupancy']._expire_seats(tz_doctors, today, current_time)
+
+        # The cron commits this batch and runs again while appointments remain
+        self.env['ir.cron']._notify_progress(done=done, remaining=remaining)
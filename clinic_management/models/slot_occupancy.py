@@ -0,0 +1,192 @@
+from odoo import models, fields, api
+
+
+# Appointment states that keep a seat reserved in their slot
+SEAT_STATES = ('confirmed', 'checked_in', 'in_consultation', 'completed')
+
+
+class ClinicSlotOccupancy(models.Model):
+    _name = 'clinic.slot.occupancy'
+    _description = 'Dated Slot Occupancy'
+    _order = 'date desc, start_time'
+    _rec_name = 'slot_id'
+
+    slot_id = fields.Many2one('clinic.slot', string='Slot', required=True, ondelete='cascade', index=True)
+    doctor_id = fields.Many2one('clinic.doctor', string='Doctor', required=True, ondelete='cascade', index=True)
+    date = fields.Date(string='Date', required=True, index=True)
+    start_time = fields.Float(related='slot_id.start_time', string='Start Time', store=True)
+    end_time = fields.Float(related='slot_id.end_time', string='End Time', store=True)
+    max_patients = fields.Integer(string='Max Patients', required=True, default=1)
+    booked_count = fields.Integer(string='Booked Patients', default=0, readonly=True)
+    free_capacity = fields.Integer(string='Free Seats', readonly=True, index=True,
+                                   help='Seats left, maintained together with the booked count')
+    state = fields.Selection([
+        ('open', 'Open'),
+        ('full', 'Full'),
+        ('blocked', 'Blocked'),
+        ('expired', 'Expired'),
+    ], string='Status', default='open', required=True, index=True)
+
+    holiday_id = fields.Many2one('clinic.holiday', string='Blocked by Leave', readonly=True,
+                                 ondelete='set null', index=True)
+
+    appointment_ids = fields.One2many('clinic.appointment', 'occupancy_id', string='Appointments')
+
+    _sql_constraints = [
+        ('slot_date_uniq', 'unique(slot_id, date)',
+         'A slot can only have one occupancy record per date!'),
+        ('booked_count_positive', 'CHECK(booked_count >= 0)',
+         'Booked patients cannot be negative!'),
+    ]
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        for vals in vals_list:
+            vals.setdefault('free_capacity', vals.get('max_patients', 1) - vals.get('booked_count', 0))
+        return super().create(vals_list)
+
+    @api.model
+    def _reserve_seat(self, slot, date):
+        """Atomically take one seat of ``slot`` on ``date``.
+
+        The capacity check and the increment are one conditional UPDATE, so
+        concurrent bookings serialize on the row lock and cannot overbook.
+        Returns the occupancy record, or an empty recordset when the slot is full.
+        """
+        self.flush_model()
+        cr = self.env.cr
+        cr.execute("""
+            INSERT INTO clinic_slot_occupancy
+                (slot_id, doctor_id, date, start_time, end_time, max_patients,
+                 booked_count, free_capacity, state, create_uid, create_date, write_uid, write_date)
+            VALUES (%s, %s, %s, %s, %s, %s, 0, %s, 'open',
+                    %s, now() at time zone 'UTC', %s, now() at time zone 'UTC')
+            ON CONFLICT (slot_id, date) DO NOTHING
+        """, (slot.id, slot.doctor_id.id, date, slot.start_time, slot.end_time,
+              slot.max_patients, slot.max_patients, self.env.uid, self.env.uid))
+        cr.execute("""
+            UPDATE clinic_slot_occupancy
+               SET booked_count = booked_count + 1,
+                   free_capacity = max_patients - booked_count - 1,
+                   state = CASE WHEN booked_count + 1 >= max_patients THEN 'full' ELSE 'open' END,
+                   write_uid = %s,
+                   write_date = now() at time zone 'UTC'
+             WHERE slot_id = %s
+               AND date = %s
+               AND state = 'open'
+               AND booked_count < max_patients
+         RETURNING id
+        """, (self.env.uid, slot.id, date))
+        row = cr.fetchone()
+        if not row:
+            return self.browse()
+        occupancy = self.browse(row[0])
+        occupancy.invalidate_recordset(['booked_count', 'free_capacity', 'state', 'write_uid', 'write_date'])
+        return occupancy
+
+    @api.model
+    def _update_capacity(self, slots):
+        """Carry the new capacity of ``slots`` over to their upcoming dated rows"""
+        self.flush_model()
+        slots.flush_recordset(['max_patients'])
+        self.env.cr.execute("""
+            UPDATE clinic_slot_occupancy o
+               SET max_patients = COALESCE(s.max_patients, 1),
+                   free_capacity = CASE WHEN o.state IN ('blocked', 'expired') THEN 0
+                                        ELSE GREATEST(COALESCE(s.max_patients, 1) - o.booked_count, 0) END,
+                   state = CASE WHEN o.state IN ('blocked', 'expired') THEN o.state
+                                WHEN o.booked_count >= COALESCE(s.max_patients, 1) THEN 'full'
+                                ELSE 'open' END,
+                   write_uid = %s,
+                   write_date = now() at time zone 'UTC'
+              FROM clinic_slot s
+             WHERE s.id = o.slot_id
+               AND o.slot_id = ANY(%s)
+               AND o.date >= %s
+               AND o.max_patients != COALESCE(s.max_patients, 1)
+        """, (self.env.uid, slots.ids, fields.Date.context_today(self)))
+        self.invalidate_model()
+
+    def _release_seats(self, counts):
+        """Give back seats in one statement, ``counts`` maps occupancy ids to seat counts"""
+        if not counts:
+            return
+        self.flush_model()
+        ids = list(counts)
+        self.env.cr.execute("""
+            UPDATE clinic_slot_occupancy o
+               SET booked_count = GREATEST(o.booked_count - r.cnt, 0),
+                   free_capacity = CASE WHEN o.state IN ('blocked', 'expired') THEN 0
+                                        ELSE o.max_patients - GREATEST(o.booked_count - r.cnt, 0) END,
+                   state = CASE WHEN o.state = 'full' AND o.booked_count - r.cnt < o.max_patients
+                                THEN 'open' ELSE o.state END,
+                   write_uid = %s,
+                   write_date = now() at time zone 'UTC'
+              FROM (SELECT unnest(%s::int[]) AS id, unnest(%s::int[]) AS cnt) r
+             WHERE o.id = r.id
+        """, (self.env.uid, ids, [counts[i] for i in ids]))
+        self.browse(ids).invalidate_recordset(['booked_count', 'free_capacity', 'state', 'write_uid', 'write_date'])
+
+    @api.model
+    def _block_seats(self, blocked):
+        """Block dated slots in one statement, ``blocked`` maps (slot id, date) pairs to leave ids"""
+        self.flush_model()
+        keys = list(blocked)
+        self.env.cr.execute("""
+            INSERT INTO clinic_slot_occupancy
+                (slot_id, doctor_id, date, start_time, end_time, max_patients,
+                 booked_count, free_capacity, state, holiday_id,
+                 create_uid, create_date, write_uid, write_date)
+            SELECT s.id, s.doctor_id, k.date, s.start_time, s.end_time, COALESCE(s.max_patients, 1),
+                   0, 0, 'blocked', k.holiday_id,
+                   %(uid)s, now() at time zone 'UTC', %(uid)s, now() at time zone 'UTC'
+              FROM (SELECT unnest(%(slot_ids)s::int[]) AS slot_id,
+                           unnest(%(dates)s::date[]) AS date,
+                           unnest(%(holiday_ids)s::int[]) AS holiday_id) k
+              JOIN clinic_slot s ON s.id = k.slot_id
+            ON CONFLICT (slot_id, date) DO UPDATE
+               SET state = 'blocked',
+                   free_capacity = 0,
+                   holiday_id = EXCLUDED.holiday_id,
+                   write_uid = EXCLUDED.write_uid,
+                   write_date = EXCLUDED.write_date
+             WHERE clinic_slot_occupancy.state != 'blocked'
+        """, {
+            'uid': self.env.uid,
+            'slot_ids': [slot_id for slot_id, _date in keys],
+            'dates': [date for _slot_id, date in keys],
+            'holiday_ids': [blocked[key] for key in keys],
+        })
+        self.invalidate_model()
+
+    @api.model
+    def _unblock_seats(self, holidays):
+        """Reopen the dated slots blocked by ``holidays``, manual blocks are left alone"""
+        self.flush_model()
+        self.env.cr.execute("""
+            UPDATE clinic_slot_occupancy
+               SET state = CASE WHEN booked_count >= max_patients THEN 'full' ELSE 'open' END,
+                   free_capacity = GREATEST(max_patients - booked_count, 0),
+                   holiday_id = NULL,
+                   write_uid = %s,
+                   write_date = now() at time zone 'UTC'
+             WHERE holiday_id = ANY(%s)
+               AND state = 'blocked'
+        """, (self.env.uid, holidays.ids))
+        self.invalidate_model()
+
+    @api.model
+    def _expire_seats(self, doctors, date, time):
+        """Close the dated slots of ``doctors`` that ended before ``date`` at ``time``"""
+        self.flush_model()
+        self.env.cr.execute("""
+            UPDATE clinic_slot_occupancy
+               SET state = 'expired',
+                   free_capacity = 0,
+                   write_uid = %(uid)s,
+                   write_date = now() at time zone 'UTC'
+             WHERE doctor_id = ANY(%(doctor_ids)s)
+               AND state IN ('open', 'full')
+               AND (date < %(date)s OR (date = %(date)s AND end_time < %(time)s))
+        """, {'uid': self.env.uid, 'doctor_ids': doctors.ids, 'date': date, 'time': time})
+        self.invalidate_model()
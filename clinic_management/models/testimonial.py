@@ -2,15 +2,24 @@
 
 from odoo import api, fields, models, _
 
+# Fields rendered on the public website pages
+WEBSITE_FIELDS = {
+    'name', 'image', 'image_thumb', 'sequence', 'active', 'rating', 'comment',
+    'service_id', 'doctor_id', 'date', 'display_on_website', 'state',
+}
+
 
 class ClinicTestimonial(models.Model):
     _name = 'clinic.testimonial'
     _description = 'Clinic Patient Testimonial'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'clinic.image.mixin']
     _order = 'sequence, id desc'
+    _clinic_public_images = ('image_thumb',)
     
     name = fields.Char(string='Patient Name', required=True)
-    image = fields.Binary(string='Patient Image')
+    image = fields.Binary(string='Patient Image', attachment=True)
+    image_thumb = fields.Image(string='Patient Thumbnail', related='image',
+                               max_width=128, max_height=128, store=True)
     sequence = fields.Integer(string='Sequence', default=10)
     active = fields.Boolean(string='Active', default=True)
     # Changed from Selection to Float but kept compatibility with existing records
@@ -34,6 +43,29 @@ class ClinicTestimonial(models.Model):
     company_id = fields.Many2one('res.company', string='Company', 
                                  default=lambda self: self.env.company)
     
+    @api.model_create_multi
+    def create(self, vals_list):
+        testimonials = super().create(vals_list)
+        # Submissions from the website stay in draft and are not shown yet
+        if any(testimonial.state == 'published' for testimonial in testimonials):
+            self.env['clinic.website.settings']._bump_content_version()
+        return testimonials
+
+    def write(self, vals):
+        result = super().write(vals)
+        # Each bump clears the registry caches, only do it for what the site shows
+        if WEBSITE_FIELDS & vals.keys():
+            self.env['clinic.website.settings']._bump_content_version()
+        return result
+
+    def unlink(self):
+        result = super().unlink()
+        self.env['clinic.website.settings']._bump_content_version()
+        return result
+
+    def _clinic_image_is_public(self):
+        return self.active and self.state == 'published'
+
     @api.model
     def get_website_testimonials(self):
         """Get testimonials for display on website"""
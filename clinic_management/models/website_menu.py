@@ -1,23 +1,35 @@
 from odoo import models, fields, api, _
 
+SERVICE_MENU_DIRTY_KEY = 'clinic.service.menus'
+# Sequence of the first service entry, "All Services" stays on top
+SERVICE_MENU_SEQUENCE = 10
+
+
 class WebsiteMenu(models.Model):
     _inherit = 'website.menu'
 
+    clinic_service_id = fields.Many2one('clinic.service', string='Clinic Service',
+                                        ondelete='cascade', index='btree_not_null')
+
+    @api.model
+    def _get_services_parent_menu(self):
+        return self.env.ref('clinic_management.menu_clinic_services_parent', raise_if_not_found=False)
+
     @api.model
     def create_service_menus(self):
         """Create website menu items for services"""
         # Find the services parent menu
-        services_parent = self.env.ref('clinic_management.menu_clinic_services_parent', raise_if_not_found=False)
+        services_parent = self._get_services_parent_menu()
         if not services_parent:
             return
-        
-        # Remove existing service menus
-        existing_service_menus = self.search([
+
+        # Remove service menus that are not linked to their service (older installs)
+        self.search([
             ('parent_id', '=', services_parent.id),
+            ('clinic_service_id', '=', False),
             ('name', '!=', 'All Services')
-        ])
-        existing_service_menus.unlink()
-        
+        ]).unlink()
+
         # Create "All Services" menu if it doesn't exist
         all_services_menu = self.search([
             ('parent_id', '=', services_parent.id),
@@ -30,20 +42,89 @@ class WebsiteMenu(models.Model):
                 'parent_id': services_parent.id,
                 'sequence': 1,
             })
-        
-        # Get active services
-        services = self.env['clinic.service'].search([('active', '=', True)], order='name')
-        
-        # Create menu item for each service
-        sequence = 10
-        for service in services:
-            self.create({
-                'name': service.name,
-                'url': f'/clinic/service/{service.id}',
-                'parent_id': services_parent.id,
-                'sequence': sequence,
-            })
-            sequence += 1
+
+        self._sync_service_menus(self.env['clinic.service'].with_context(active_test=False).search([]))
+
+    @api.model
+    def _mark_service_menus_dirty(self, services):
+        """Queue ``services`` for one menu sync at the end of the transaction"""
+        if not services:
+            return
+        precommit = self.env.cr.precommit
+        dirty = precommit.data.setdefault(SERVICE_MENU_DIRTY_KEY, set())
+        if not dirty:
+            precommit.add(self.sudo()._sync_dirty_service_menus)
+        dirty.update(services.ids)
+
+    @api.model
+    def _sync_dirty_service_menus(self):
+        """Precommit hook syncing the menus of the services queued during the transaction"""
+        services = self.env['clinic.service'].browse(
+            self.env.cr.precommit.data.pop(SERVICE_MENU_DIRTY_KEY, set()))
+        self._sync_service_menus(services)
+        # Precommit hooks run after the final flush, write the new and renamed entries now
+        self.env.flush_all()
+
+    @api.model
+    def _sync_service_menus(self, services):
+        """Add, rename or remove the menu entries of ``services``, leaving the others untouched"""
+        services_parent = self._get_services_parent_menu()
+        if not services_parent:
+            return
+        services = services.with_context(active_test=False).exists()
+        menus = self.search([('clinic_service_id', 'in', services.ids)])
+
+        # Archived services lose their entry
+        menus.filtered(lambda menu: not menu.clinic_service_id.active).unlink()
+
+        menu_by_service = {menu.clinic_service_id: menu for menu in menus.exists()}
+        to_create = []
+        renamed = False
+        for service in services.filtered('active'):
+            menu = menu_by_service.get(service)
+            if not menu:
+                to_create.append({
+                    'name': service.name,
+                    'url': f'/clinic/service/{service.id}',
+                    'parent_id': services_parent.id,
+                    'sequence': SERVICE_MENU_SEQUENCE,
+                    'clinic_service_id': service.id,
+                })
+            elif menu.name != service.name:
+                menu.name = service.name
+                renamed = True
+        if to_create:
+            self.create(to_create)
+        if to_create or renamed:
+            self._resequence_service_menus(services_parent)
+
+    @api.model
+    def _resequence_service_menus(self, services_parent):
+        """Keep the service entries sorted by name, only the entries that moved are rewritten"""
+        menus = self.search_fetch([
+            ('parent_id', '=', services_parent.id),
+            ('clinic_service_id', '!=', False)
+        ], ['name', 'sequence'])
+        ordered = menus.sorted(lambda menu: ((menu.name or '').lower(), menu.id))
+        moved = {
+            menu.id: sequence
+            for sequence, menu in enumerate(ordered, SERVICE_MENU_SEQUENCE)
+            if menu.sequence != sequence
+        }
+        if not moved:
+            return
+        self.flush_model(['sequence'])
+        self.env.cr.execute("""
+            UPDATE website_menu m
+               SET sequence = r.sequence,
+                   write_uid = %s,
+                   write_date = now() at time zone 'UTC'
+              FROM (SELECT unnest(%s::int[]) AS id, unnest(%s::int[]) AS sequence) r
+             WHERE m.id = r.id
+        """, (self.env.uid, list(moved), list(moved.values())))
+        self.browse(moved).invalidate_recordset(['sequence', 'write_uid', 'write_date'])
+        # Website menus are rendered from the templates cache
+        self.env.registry.clear_cache('templates')
 
 
 class ClinicService(models.Model):
@@ -51,21 +132,19 @@ class ClinicService(models.Model):
 
     @api.model_create_multi
     def create(self, vals_list):
-        """Update website menus when new service is created"""
+        """Add the website menus of new services at the end of the transaction"""
         services = super().create(vals_list)
-        # Update website menus
-        self.env['website.menu'].create_service_menus()
+        self.env['website.menu']._mark_service_menus_dirty(services)
         return services
 
     def write(self, vals):
-        """Update website menus when service is updated"""
+        """Rename or remove the website menus of updated services at the end of the transaction"""
         result = super().write(vals)
         if 'name' in vals or 'active' in vals:
-            self.env['website.menu'].create_service_menus()
+            self.env['website.menu']._mark_service_menus_dirty(self)
         return result
 
     def unlink(self):
-        """Update website menus when service is deleted"""
-        result = super().unlink()
-        self.env['website.menu'].create_service_menus()
-        return result
+        """Remove the website menus of deleted services"""
+        self.env['website.menu'].sudo().search([('clinic_service_id', 'in', self.ids)]).unlink()
+        return super().unlink()
@@ -34,6 +34,8 @@ class AppointmentDashboard extends Component {
             current_page: 1,
             records_per_page: 15,
             total_records: 0,
+            next_cursor: false,
+            prev_cursor: false,
             selected_state: null,
         };
 
@@ -106,23 +108,31 @@ class AppointmentDashboard extends Component {
         }
     }
 
-    async _fetch_list_data() {
+    async _fetch_list_data(cursor = null, direction = 'next') {
         try {
-            const offset = (this.state.current_page - 1) * this.state.records_per_page;
+            // The total is only counted when the pager starts over
             const result = await this.orm.call("clinic.appointment", "get_appointment_list_data", [
                 this.state.doctor_id,
                 this.state.time_filter,
                 this.state.selected_state,
-                offset,
-                this.state.records_per_page
+                cursor,
+                direction,
+                this.state.records_per_page,
+                !cursor,
             ]);
             
-            this.state.total_records = result.total_records;
+            if (result.total_records !== null) {
+                this.state.total_records = result.total_records;
+            }
             this.state.records = result.records;
+            this.state.next_cursor = result.next_cursor;
+            this.state.prev_cursor = result.prev_cursor;
         } catch (error) {
             console.error('Error fetching list data:', error);
             this.state.records = [];
             this.state.total_records = 0;
+            this.state.next_cursor = false;
+            this.state.prev_cursor = false;
         }
     }
 
@@ -346,17 +356,16 @@ class AppointmentDashboard extends Component {
     }
 
     go_to_previous_page() {
-        if (this.state.current_page > 1) {
+        if (this.state.prev_cursor) {
             this.state.current_page -= 1;
-            this._fetch_list_data();
+            this._fetch_list_data(this.state.prev_cursor, 'prev');
         }
     }
 
     go_to_next_page() {
-        const total_pages = Math.ceil(this.state.total_records / this.state.records_per_page);
-        if (this.state.current_page < total_pages) {
+        if (this.state.next_cursor) {
             this.state.current_page += 1;
-            this._fetch_list_data();
+            this._fetch_list_data(this.state.next_cursor, 'next');
         }
     }
 
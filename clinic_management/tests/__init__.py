@@ -0,0 +1,3 @@
+from . import test_slot_occupancy
+from . import test_query_plans
+from . import test_appointment_completion
@@ -0,0 +1,66 @@
+from datetime import timedelta
+
+from odoo import Command, fields
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestAppointmentCompletion(TransactionCase):
+    """Completing an appointment leaves the follow-up and the email to the job queue"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.doctor = cls.env['clinic.doctor'].create({
+            'name': 'Completion Test Doctor',
+            'working_start_time': 9.0,
+            'working_end_time': 12.0,
+            'available_days': [Command.set(cls.env['clinic.days'].search([]).ids)],
+        })
+        cls.service = cls.env['clinic.service'].create({'name': 'Completion Test Service'})
+        cls.patient = cls.env['clinic.patient'].create({
+            'name': 'Completion Test Patient',
+            'phone': '+15550009999',
+            'email': 'completion.patient@example.com',
+        })
+
+    def _create_appointment(self, **vals):
+        date = fields.Date.today() + timedelta(days=1)
+        slot = self.env['clinic.slot']._get_free_slots(self.doctor, date)[:1]
+        self.assertTrue(slot, "The test doctor should have a free slot")
+        return self.env['clinic.appointment'].create({
+            'patient_id': self.patient.id,
+            'service_id': self.service.id,
+            'doctor_id': self.doctor.id,
+            'slot_id': slot.id,
+            'appointment_date': date,
+            'state': 'confirmed',
+            **vals,
+        })
+
+    def test_complete_with_follow_up(self):
+        appointment = self._create_appointment(next_visit_days=7)
+        appointment.action_complete()
+        job = appointment.completion_job_ids
+        self.assertEqual(job.state, 'pending')
+
+        self.env['clinic.appointment.job']._cron_process_jobs()
+
+        self.assertEqual(job.state, 'done', job.last_error)
+        follow_up = appointment.rescheduled_to_id
+        self.assertTrue(follow_up, "The follow-up appointment should be created")
+        self.assertEqual(follow_up.service_id, appointment.service_id)
+        self.assertEqual(follow_up.appointment_date, appointment.next_visit_date)
+        self.assertEqual(follow_up.state, 'confirmed')
+        self.assertTrue(self.env['mail.mail'].search([
+            ('model', '=', 'clinic.appointment'),
+            ('res_id', '=', appointment.id),
+        ]), "The completion email should be queued")
+
+    def test_complete_without_follow_up(self):
+        appointment = self._create_appointment()
+        appointment.action_complete()
+        self.env['clinic.appointment.job']._cron_process_jobs()
+
+        self.assertEqual(appointment.completion_job_ids.state, 'done')
+        self.assertFalse(appointment.rescheduled_to_id)
@@ -0,0 +1,174 @@
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests import TransactionCase, tagged
+from odoo.tools import SQL
+
+
+@tagged('post_install', '-at_install')
+class TestQueryPlans(TransactionCase):
+    """The dashboard, cron and lookup queries are served by the module's indexes
+
+    The tables are seeded with a few years of history and analyzed, so the
+    planner prices the queries on realistic statistics and each hot query has
+    to pick one of the indexes designed for it.
+    """
+
+    DOCTORS = 40
+    PATIENTS = 20000
+    APPOINTMENTS = 60000
+    HISTORY_DAYS = 1095
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        company = cls.env.company
+        service = cls.env['clinic.service'].create({'name': 'Query Plan Service'})
+        doctors = cls.env['clinic.doctor'].create([
+            {'name': f'Query Plan Doctor {i}', 'working_start_time': 9.0, 'working_end_time': 17.0}
+            for i in range(cls.DOCTORS)
+        ])
+        slot = cls.env['clinic.slot'].create({
+            'doctor_id': doctors[0].id,
+            'day_id': cls.env.ref('clinic_management.days_monday').id,
+            'start_time': 9.0,
+            'end_time': 9.5,
+            'duration': 30,
+            'slot_number': 'QUERY-PLAN-1',
+        })
+        cls.env.flush_all()
+
+        cr = cls.env.cr
+        params = {
+            'uid': cls.env.uid,
+            'company_id': company.id,
+            'currency_id': company.currency_id.id,
+            'service_id': service.id,
+            'slot_id': slot.id,
+            'doctor_ids': doctors.ids,
+            'patients': cls.PATIENTS,
+            'appointments': cls.APPOINTMENTS,
+            'history_days': cls.HISTORY_DAYS,
+            'today': fields.Date.today(),
+        }
+        cr.execute("""
+            INSERT INTO clinic_patient
+                (name, phone, phone_key, company_id, active, create_uid, create_date, write_uid, write_date)
+            SELECT 'Query Plan Patient ' || i, '+1555' || lpad(i::text, 7, '0'), '+1555' || lpad(i::text, 7, '0'),
+                   %(company_id)s, TRUE, %(uid)s, now(), %(uid)s, now()
+              FROM generate_series(1, %(patients)s) i
+            RETURNING id
+        """, params)
+        params['patient_ids'] = [row[0] for row in cr.fetchall()]
+        # Past appointments are settled, only the coming month is still open
+        cr.execute("""
+            INSERT INTO clinic_appointment
+                (name, patient_id, service_id, doctor_id, slot_id, appointment_date, state,
+                 company_id, currency_id, consulting_fee, start_time, end_time,
+                 create_uid, create_date, write_uid, write_date)
+            SELECT 'QP' || i,
+                   (%(patient_ids)s::int[])[1 + i %% %(patients)s],
+                   %(service_id)s,
+                   (%(doctor_ids)s::int[])[1 + i %% cardinality(%(doctor_ids)s::int[])],
+                   %(slot_id)s,
+                   d.date,
+                   CASE WHEN d.date >= %(today)s THEN 'confirmed'
+                        ELSE (ARRAY['completed', 'completed', 'completed', 'cancelled', 'no_show'])[1 + i %% 5]
+                   END,
+                   %(company_id)s, %(currency_id)s, 50, 9.0, 9.5,
+                   %(uid)s, now(), %(uid)s, now()
+              FROM generate_series(1, %(appointments)s) i,
+                   LATERAL (SELECT %(today)s::date + 30 - (i %% (%(history_days)s + 30)) AS date) d
+        """, params)
+        cr.execute("""
+            INSERT INTO clinic_holiday
+                (name, doctor_id, leave_type, from_date, to_date, state, slots_released, company_id,
+                 create_uid, create_date, write_uid, write_date)
+            SELECT 'Query Plan Leave ' || i,
+                   (%(doctor_ids)s::int[])[1 + i %% cardinality(%(doctor_ids)s::int[])],
+                   'full_day', d.date, d.date + 2, 'approved', d.date < %(today)s - 7, %(company_id)s,
+                   %(uid)s, now(), %(uid)s, now()
+              FROM generate_series(1, 5000) i,
+                   LATERAL (SELECT %(today)s::date + 30 - (i %% (%(history_days)s + 30)) AS date) d
+        """, params)
+        cls.env.invalidate_all()
+        cls.env['clinic.appointment.daily.stat']._rebuild()
+        for table in ('clinic_patient', 'clinic_appointment', 'clinic_holiday', 'clinic_appointment_daily_stat'):
+            cr.execute(SQL("ANALYZE %s", SQL.identifier(table)))
+
+    def _explain(self, model, domain, order=None, limit=None):
+        query = self.env[model]._search(domain, order=order, limit=limit)
+        self.env.cr.execute(SQL("EXPLAIN %s", query.select()))
+        return '\n'.join(row[0] for row in self.env.cr.fetchall())
+
+    def assertIndexScan(self, plan, *indexes):
+        """Assert the plan reads one of ``indexes``, a scan of the table or its primary key fails"""
+        self.assertTrue(any(index in plan for index in indexes),
+                        f"Expected a scan of {' or '.join(indexes)}:\n{plan}")
+
+    def test_dashboard_table_page(self):
+        Appointment = self.env['clinic.appointment']
+        plan = self._explain('clinic.appointment', Appointment._get_dashboard_domain(None, 'month'),
+                             order='appointment_date desc, id desc', limit=16)
+        self.assertIndexScan(plan, 'clinic_appointment_company_date_id_index')
+
+    def test_dashboard_state_filter(self):
+        Appointment = self.env['clinic.appointment']
+        plan = self._explain('clinic.appointment', Appointment._get_dashboard_domain(None, 'month', 'cancelled'),
+                             order='appointment_date desc, id desc', limit=16)
+        self.assertIndexScan(plan, 'clinic_appointment_company_state_date_index',
+                             'clinic_appointment_company_date_id_index')
+
+    def test_dashboard_doctor_filter(self):
+        Appointment = self.env['clinic.appointment']
+        doctor = self.env['clinic.doctor'].search([('name', '=like', 'Query Plan Doctor %')], limit=1)
+        plan = self._explain('clinic.appointment', Appointment._get_dashboard_domain(doctor.id, 'week'),
+                             order='appointment_date desc, id desc', limit=16)
+        self.assertIndexScan(plan, 'clinic_appointment_doctor_date_index',
+                             'clinic_appointment_company_date_id_index')
+
+    def test_dashboard_rollup(self):
+        Appointment = self.env['clinic.appointment']
+        plan = self._explain('clinic.appointment.daily.stat', Appointment._get_dashboard_stat_domain(None, 'month'))
+        self.assertIndexScan(plan, 'clinic_appointment_daily_stat__date_index')
+
+    def test_expiry_cron_open_appointments(self):
+        doctors = self.env['clinic.doctor'].search([('name', '=like', 'Query Plan Doctor %')])
+        today = fields.Date.today()
+        plan = self._explain('clinic.appointment', [
+            ('doctor_id', 'in', doctors.ids),
+            ('state', '=', 'confirmed'),
+            '|', ('appointment_date', '<', today),
+            '&', ('appointment_date', '=', today), ('end_time', '<', 12.0),
+        ], order='appointment_date, id', limit=1000)
+        self.assertIndexScan(plan, 'clinic_appointment_open_date_index')
+
+    def test_leave_overlap(self):
+        doctor = self.env['clinic.doctor'].search([('name', '=like', 'Query Plan Doctor %')], limit=1)
+        day = fields.Date.today() + timedelta(days=3)
+        plan = self._explain('clinic.holiday', [
+            ('doctor_id', '=', doctor.id),
+            ('state', '=', 'approved'),
+            ('from_date', '<=', day),
+            ('to_date', '>=', day),
+        ])
+        self.assertIndexScan(plan, 'clinic_holiday_doctor_state_dates_index')
+
+    def test_leave_expiry_cron(self):
+        plan = self._explain('clinic.holiday', [
+            ('to_date', '<', fields.Date.today()),
+            ('state', '=', 'approved'),
+            ('slots_released', '=', False),
+        ], order='to_date, id', limit=500)
+        self.assertIndexScan(plan, 'clinic_holiday_unreleased_index')
+
+    def test_patient_phone_lookup(self):
+        plan = self._explain('clinic.patient', [('phone', '=', '+15550001001')], limit=1)
+        self.assertIndexScan(plan, 'clinic_patient__phone_index')
+
+    def test_patient_phone_key_lookup(self):
+        plan = self._explain('clinic.patient', [
+            ('company_id', '=', self.env.company.id),
+            ('phone_key', '=', '+15550001001'),
+        ], order='id')
+        self.assertIndexScan(plan, 'clinic_patient_company_phone_key_index')
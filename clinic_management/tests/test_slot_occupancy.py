@@ -0,0 +1,86 @@
+from datetime import timedelta
+import threading
+
+from psycopg2 import errors
+
+from odoo import api, fields, SUPERUSER_ID
+from odoo.modules.registry import Registry
+from odoo.tests import BaseCase, tagged
+from odoo.tests.common import get_db_name
+
+PG_CONCURRENCY_ERRORS = (errors.SerializationFailure, errors.DeadlockDetected, errors.LockNotAvailable)
+
+
+@tagged('post_install', '-at_install')
+class TestSlotOccupancyConcurrency(BaseCase):
+    """Bookings racing for the same slot, each on its own committed transaction"""
+
+    MAX_PATIENTS = 3
+    BOOKINGS = 10
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.registry = Registry(get_db_name())
+
+    def setUp(self):
+        super().setUp()
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            doctor = env['clinic.doctor'].create({
+                'name': 'Concurrency Test Doctor',
+                'working_start_time': 9.0,
+                'working_end_time': 17.0,
+            })
+            slot = env['clinic.slot'].create({
+                'doctor_id': doctor.id,
+                'day_id': env.ref('clinic_management.days_monday').id,
+                'start_time': 9.0,
+                'end_time': 9.5,
+                'duration': 30,
+                'slot_number': 'CONCURRENCY-1',
+                'max_patients': self.MAX_PATIENTS,
+            })
+            self.doctor_id, self.slot_id = doctor.id, slot.id
+        self.date = fields.Date.today() + timedelta(days=30)
+        self.addCleanup(self._cleanup)
+
+    def _cleanup(self):
+        with self.registry.cursor() as cr:
+            api.Environment(cr, SUPERUSER_ID, {})['clinic.doctor'].browse(self.doctor_id).unlink()
+
+    def _book(self, barrier, results):
+        barrier.wait()
+        # Retry like the HTTP layer does when a concurrent insert wins
+        for _attempt in range(20):
+            try:
+                with self.registry.cursor() as cr:
+                    env = api.Environment(cr, SUPERUSER_ID, {})
+                    slot = env['clinic.slot'].browse(self.slot_id)
+                    booked = bool(env['clinic.slot.occupancy']._reserve_seat(slot, self.date))
+            except PG_CONCURRENCY_ERRORS:
+                continue
+            results.append(booked)
+            return
+
+    def test_concurrent_reservations_never_overbook(self):
+        barrier = threading.Barrier(self.BOOKINGS)
+        results = []
+        threads = [threading.Thread(target=self._book, args=(barrier, results)) for _i in range(self.BOOKINGS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(results), self.BOOKINGS, "every booking attempt should get an answer")
+        self.assertEqual(results.count(True), self.MAX_PATIENTS)
+
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            occupancy = env['clinic.slot.occupancy'].search([
+                ('slot_id', '=', self.slot_id),
+                ('date', '=', self.date),
+            ])
+            self.assertEqual(occupancy.booked_count, self.MAX_PATIENTS)
+            self.assertEqual(occupancy.free_capacity, 0)
+            self.assertEqual(occupancy.state, 'full')
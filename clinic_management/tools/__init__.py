@@ -0,0 +1 @@
+from . import prescription_pdf
@@ -0,0 +1,122 @@
+"""Render handwritten prescription images to PDF, one image or a batch at a time.
+
+The module only depends on Pillow (and img2pdf when installed), so it can be
+benchmarked on its own::
+
+    python prescription_pdf.py [--workers N] scan1.png scan2.png ...
+"""
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import io
+import logging
+import os
+import time
+
+_logger = logging.getLogger(__name__)
+
+# Longest side kept in the PDF, the canvas widget saves full screen resolution
+MAX_SIDE = 1600
+# Refuse images that would not fit in memory once decoded
+MAX_PIXELS = 40_000_000
+JPEG_QUALITY = 80
+PDF_RESOLUTION = 150.0
+# Pillow releases the GIL while decoding, resizing and encoding, so threads
+# render in parallel without forking the server worker
+MAX_WORKERS = min(4, os.cpu_count() or 1)
+
+
+def render_pdf(image_bytes):
+    """Return the PDF bytes of one image, or None when it cannot be read"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    try:
+        img = Image.open(io.BytesIO(image_bytes))
+        if img.width * img.height > MAX_PIXELS:
+            _logger.warning('Prescription image of %sx%s is too large to render', img.width, img.height)
+            return None
+
+        # JPEG scans that are already small are embedded as is, no re-encoding
+        if img.format == 'JPEG' and max(img.size) <= MAX_SIDE:
+            try:
+                import img2pdf
+                return img2pdf.convert(image_bytes)
+            except Exception:
+                pass
+
+        # Let the JPEG decoder skip to a reduced scale, then downscale in place
+        img.draft('RGB', (MAX_SIDE, MAX_SIDE))
+        img.thumbnail((MAX_SIDE, MAX_SIDE))
+
+        # Flatten the transparent canvas onto white
+        if img.mode in ('RGBA', 'LA', 'P'):
+            img = img.convert('RGBA')
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            background.paste(img, mask=img.getchannel('A'))
+            img = background
+        elif img.mode != 'RGB':
+            img = img.convert('RGB')
+
+        out = io.BytesIO()
+        img.save(out, format='PDF', resolution=PDF_RESOLUTION, quality=JPEG_QUALITY)
+        return out.getvalue()
+    except Exception:
+        _logger.warning('Could not render prescription image to PDF', exc_info=True)
+        return None
+
+
+def render_pdfs(images, max_workers=MAX_WORKERS):
+    """Render ``images``, an iterable of (key, image bytes) pairs, and return a dict of keys to PDF bytes
+
+    Images are rendered by a pool of ``max_workers`` threads. At most two
+    images per thread are in flight, pass a generator to keep the other
+    sources out of memory. The calling thread alone consumes ``images``,
+    so it may read them from the database. Keys whose image could not be
+    rendered map to None.
+    """
+    started = time.perf_counter()
+    pdfs = {}
+    size_in = 0
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='prescription_pdf') as pool:
+        pending = {}
+
+        def collect(futures):
+            for future in futures:
+                pdfs[pending.pop(future)] = future.result()
+
+        for key, image_bytes in images:
+            size_in += len(image_bytes)
+            pending[pool.submit(render_pdf, image_bytes)] = key
+            if len(pending) >= 2 * max_workers:
+                collect(wait(pending, return_when=FIRST_COMPLETED).done)
+        collect(list(pending))
+    if not pdfs:
+        return pdfs
+
+    elapsed = time.perf_counter() - started
+    _logger.info('Rendered %s prescription PDFs (%.1f MB in) in %.2fs, %.1f images/s',
+                 len(pdfs), size_in / 1e6, elapsed, len(pdfs) / elapsed if elapsed else 0)
+    return pdfs
+
+
+def _benchmark(paths, max_workers=MAX_WORKERS):
+    def read(path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    size_in = sum(len(read(path)) for path in paths)
+    started = time.perf_counter()
+    pdfs = render_pdfs(((path, read(path)) for path in paths), max_workers=max_workers)
+    elapsed = time.perf_counter() - started
+    size_out = sum(len(pdf or b'') for pdf in pdfs.values())
+    print(f"{max_workers} workers: {len(paths)} images in {elapsed:.2f}s, {len(paths) / elapsed:.1f} images/s, "
+          f"{size_in / 1e6:.1f} MB -> {size_out / 1e6:.1f} MB")
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Benchmark prescription PDF rendering')
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help='rendering threads')
+    parser.add_argument('paths', nargs='+', help='image files to render')
+    args = parser.parse_args()
+    _benchmark(args.paths, args.workers)
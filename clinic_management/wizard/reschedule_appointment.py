@@ -17,29 +17,26 @@ class AppointmentRescheduleWizard(models.TransientModel):
     # New appointment details
     new_date = fields.Date(string='New Date', required=True)
     new_slot_id = fields.Many2one('clinic.slot', string='New Slot', required=True,
-                                 domain="[('doctor_id', '=', doctor_id), ('status', '=', 'available')]")
+                                 domain="[('id', 'in', slots)]")
+    slots = fields.Many2many('clinic.slot', string='Free Slots')
     reason = fields.Text(string='Reason for Reschedule')
     
     @api.onchange('doctor_id', 'new_date')
     def _onchange_doctor_date(self):
         """When doctor or date changes, reset slot and filter available slots"""
         self.new_slot_id = False
+        self.slots = False
         if not self.doctor_id or not self.new_date:
             return
         
-        # Get day of the week
-        weekday = self.new_date.weekday()  # 0 = Monday, 6 = Sunday
-        day_names = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-        day_name = day_names[weekday]
-        
         # Find corresponding day record
-        day = self.env['clinic.days'].search([('name', '=', day_name)], limit=1)
+        day = self.env['clinic.days']._get_day_for_date(self.new_date)
         
         if not day:
             return {
                 'warning': {
                     'title': 'No Day Configuration',
-                    'message': f"Could not find day configuration for {day_name}"
+                    'message': f"Could not find day configuration for {self.new_date}"
                 }
             }
         
@@ -48,7 +45,7 @@ class AppointmentRescheduleWizard(models.TransientModel):
             return {
                 'warning': {
                     'title': 'Doctor Not Available',
-                    'message': f"Doctor {self.doctor_id.name} is not available on {day_name}"
+                    'message': f"Doctor {self.doctor_id.name} is not available on {day.name}"
                 }
             }
         
@@ -67,6 +64,8 @@ class AppointmentRescheduleWizard(models.TransientModel):
                     'message': f"Doctor {self.doctor_id.name} is on leave on {self.new_date}"
                 }
             }
+
+        self.slots = self.env['clinic.slot']._get_free_slots(self.doctor_id, self.new_date)
     
     def action_reschedule(self):
         """Reschedule the appointment"""
@@ -75,13 +74,11 @@ class AppointmentRescheduleWizard(models.TransientModel):
         if self.appointment_id.state in ['completed', 'no_show']:
             raise ValidationError(_("Cannot reschedule an appointment that is completed, cancelled, or marked as no-show"))
         
-        # Check if new slot is available
-        if self.new_slot_id.status != 'available':
-            raise ValidationError(_("The selected slot is no longer available"))
-        
-        # Create new appointment
+        # Create new appointment, which reserves the new seat and raises
+        # if the slot filled up in the meantime
         new_appointment = self.env['clinic.appointment'].create({
             'patient_id': self.patient_id.id,
+            'service_id': self.appointment_id.service_id.id,
             'doctor_id': self.doctor_id.id,
             'slot_id': self.new_slot_id.id,
             'appointment_date': self.new_date,
@@ -91,20 +88,13 @@ class AppointmentRescheduleWizard(models.TransientModel):
             'original_appointment_id': self.appointment_id.id,
         })
         
-        # Update original appointment
+        # Update original appointment, which gives back its seat
         self.appointment_id.write({
             'state': 'rescheduled',
             'rescheduled_to_id': new_appointment.id,
             'cancellation_reason': self.reason or 'Rescheduled by user'
         })
         
-        # Update slot statuses
-        self.new_slot_id.status = 'booked'
-        
-        # If original slot is booked, make it available again
-        if self.original_slot_id.status == 'booked':
-            self.original_slot_id.status = 'available'
-        
         return {
             'type': 'ir.actions.act_window',
             'name': _('Rescheduled Appointment'),